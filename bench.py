@@ -0,0 +1,633 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from simulator import load_simulator, simulator_config
+
+# Headless benchmarks for the simulator and the hot paths of the Streamlit apps.
+# Nothing here starts a Streamlit server or talks to a real SMTP server (alerts
+# go to mailer.LocalSMTPServer): the app cases run the
+# same pandas/openpyxl/sklearn work as the pages, against generated data in a
+# scratch directory. Results are written as JSON so two runs can be compared:
+#
+#   python bench.py --out before.json
+#   python bench.py --out after.json --compare before.json
+
+BILL_CATEGORIES = ["Electricity", "Water", "Internet", "Gas", "Other"]
+BILL_TYPES = ["Household", "Business"]
+
+# Sizes per case: full run and --quick run
+SIZES = {
+    "simulate_loop": ([1500, 3000, 6000], [300, 600]),
+    "simulate_vectorized": ([1500, 3000, 6000, 15000], [300, 600]),
+    "simulate_rollups_only": ([1500, 3000, 6000, 15000], [300, 600]),
+    "interval_simulate": ([150, 600, 1500], [60, 150]),
+    "interval_aggregates": ([600, 1500, 6000], [60, 150]),
+    "dashboard_render": ([150, 1500, 6000], [60, 150]),
+    "scenario_sweep": ([2, 4], [2]),
+    "scenario_sweep_cached": ([2, 4], [2]),
+    "forecast_sklearn_loop": ([300, 1500, 3000], [100, 300]),
+    "forecast_batched": ([1500, 3000, 6000, 15000], [300, 600]),
+    "app_startup": ([1, 2, 3], [1, 3]),
+    "excel_bill_append": ([100, 1000, 5000], [50, 200]),
+    "sqlite_bill_append": ([100, 1000, 5000, 100000], [50, 200]),
+    "columnar_bill_append": ([100, 1000, 5000, 100000], [50, 200]),
+    "buffered_bill_inserts": ([100, 500, 2000], [50, 200]),
+    "bulk_ingest": ([100000, 1000000], [20000]),
+    "cached_bill_read": ([1000, 10000, 100000], [50, 200]),
+    "cached_columnar_read": ([1000, 10000, 100000], [50, 200]),
+    "page_reads_metrics_off": ([100, 1000], [50, 200]),
+    "page_reads_metrics_on": ([100, 1000], [50, 200]),
+    "reports_aggregation": ([1000, 10000, 100000], [500, 2000]),
+    "bills_table_full": ([1000, 10000, 100000], [500, 2000]),
+    "bills_table_page": ([1000, 10000, 100000], [500, 2000]),
+    "month_range_mask": ([10000, 100000, 1000000], [1000, 5000]),
+    "month_range_index": ([10000, 100000, 1000000], [1000, 5000]),
+    "bill_index_insert": ([10000, 100000, 1000000], [1000, 5000]),
+    "reports_rollup": ([1000, 10000, 100000], [500, 2000]),
+    "reading_ingest": ([100000, 1000000], [20000, 100000]),
+    "appliance_monitoring": ([10, 50, 100], [5, 10]),
+    "appliance_monitoring_vectorized": ([100, 1000, 10000, 50000], [50, 500]),
+    "bill_prediction": ([100, 1000, 10000], [50, 200]),
+    "bill_prediction_cached": ([100, 1000, 10000], [50, 200]),
+    "limit_polling": ([1000, 10000, 50000], [100, 1000]),
+    "limit_scheduler": ([1000, 10000, 50000], [100, 1000]),
+    "alert_send_per_message": ([10, 50, 200], [5, 20]),
+    "alert_outbox": ([10, 50, 200, 1000], [5, 20]),
+}
+
+# Function to build a bills frame shaped like monthly_bills.xlsx (satya3 schema)
+def make_bills(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Month": rng.integers(1, 13, rows),
+        "Category": rng.choice(BILL_CATEGORIES, rows),
+        "Amount": np.round(rng.uniform(100, 5000, rows), 2),
+        "Description": "",
+        "Type": rng.choice(BILL_TYPES, rows),
+    })
+
+# Function to build an appliance frame shaped like appliance_data.xlsx
+def make_appliances(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    minutes = rng.integers(0, 24 * 60, rows)
+    return pd.DataFrame({
+        "Item": [f"Appliance_{i+1}" for i in range(rows)],
+        "Kilovolts (kV)": np.round(rng.uniform(0.1, 5, rows), 1),
+        "Start Time": [f"{m // 60:02d}:{m % 60:02d}" for m in minutes],
+        "Max Limit (kV)": np.round(rng.uniform(1, 50, rows), 1),
+        "Total Volts": 0.0,
+        "Email": [f"user{i+1}@example.com" for i in range(rows)],
+    })
+
+# ---- CASES ----
+# Each case takes (size, workdir) and returns a zero-argument callable that
+# runs the measured operation once. Setup done before returning is not timed.
+
+def case_simulate_loop(size, workdir):
+    sim = load_simulator()
+    def run():
+        with simulator_config(sim, NUM_HOUSEHOLDS=size * 2 // 3, NUM_BUSINESSES=size // 3):
+            sim.simulate_energy_consumption(seed=1)
+    return run
+
+def case_simulate_vectorized(size, workdir):
+    sim = load_simulator()
+    def run():
+        with simulator_config(sim, NUM_HOUSEHOLDS=size * 2 // 3, NUM_BUSINESSES=size // 3):
+            sim.simulate_energy_consumption_vectorized(seed=1)
+    return run
+
+def case_simulate_rollups_only(size, workdir):
+    sim = load_simulator()
+    def run():
+        with simulator_config(sim, NUM_HOUSEHOLDS=size * 2 // 3, NUM_BUSINESSES=size // 3):
+            sim.simulate_energy_rollups(seed=1)
+    return run
+
+# 15-minute readings for N entities written through the memory map
+def case_interval_simulate(size, workdir):
+    sim = load_simulator()
+    def run():
+        with simulator_config(sim, NUM_HOUSEHOLDS=size * 2 // 3, NUM_BUSINESSES=size // 3):
+            sim.simulate_interval_data(os.path.join(workdir, f"intervals_{size}"), seed=1)
+    return run
+
+# Daily totals and peak demand streamed over N entities' mapped readings; the
+# memory column stays at a few blocks however large the file is
+def case_interval_aggregates(size, workdir):
+    sim = load_simulator()
+    with simulator_config(sim, NUM_HOUSEHOLDS=size * 2 // 3, NUM_BUSINESSES=size // 3):
+        data = sim.simulate_interval_data(os.path.join(workdir, f"intervals_{size}"), seed=1)
+    def run():
+        totals = data.daily_totals()
+        peak = data.peak_demand()
+        assert peak["system_kw"] * data.interval_hours >= totals.max() / sim.INTERVALS_PER_DAY, "peak below the busiest day's mean"
+        return totals, peak
+    return run
+
+# Headless dashboard of N entities' interval data (year view, Type overlays
+# and two entities); lines are downsampled to the image width, so the time
+# should not grow with N
+def case_dashboard_render(size, workdir):
+    import dashboard
+    sim = load_simulator()
+    with simulator_config(sim, NUM_HOUSEHOLDS=size * 2 // 3, NUM_BUSINESSES=size // 3):
+        data = sim.simulate_interval_data(os.path.join(workdir, f"intervals_{size}"), seed=1)
+    dashboard.render_dashboard(data, os.path.join(workdir, "warmup.png"))  # matplotlib import and font cache
+    return lambda: dashboard.render_dashboard(data, os.path.join(workdir, f"dashboard_{size}.png"), ["Household_1", "Business_1"])
+
+# A sweep of N scenarios (sai.txt's 10000 households and 5000 businesses,
+# household ranges varied) on one worker per CPU, from an empty cache; then the same
+# sweep again once every scenario is cached (see sweep.py)
+def _sweep_scenarios(size):
+    return [{"HOUSEHOLD_RANGE": [5 + i, 30 + i]} for i in range(size)]
+
+def case_scenario_sweep(size, workdir):
+    import sweep
+    cache_dir = os.path.join(workdir, f"sweep_{size}")
+    def run():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        table = sweep.sweep(_sweep_scenarios(size), seed=0, cache_dir=cache_dir)
+        assert not table["Cached"].any()
+    return run
+
+def case_scenario_sweep_cached(size, workdir):
+    import sweep
+    cache_dir = os.path.join(workdir, f"sweep_cached_{size}")
+    sweep.sweep(_sweep_scenarios(size), seed=0, cache_dir=cache_dir)
+    def run():
+        table = sweep.sweep(_sweep_scenarios(size), seed=0, cache_dir=cache_dir)
+        assert table["Cached"].all()
+    return run
+
+# Per-entity next-month forecasts with one sklearn LinearRegression per entity
+def case_forecast_sklearn_loop(size, workdir):
+    from sklearn.linear_model import LinearRegression
+    import forecast
+    sim = load_simulator()
+    with simulator_config(sim, NUM_HOUSEHOLDS=size * 2 // 3, NUM_BUSINESSES=size // 3):
+        _, _, usage = forecast.simulate_usage_matrix(seed=0)
+    X = np.arange(usage.shape[1]).reshape(-1, 1)
+    future = np.arange(usage.shape[1], usage.shape[1] + 30).reshape(-1, 1)
+    return lambda: [LinearRegression().fit(X, row).predict(future).sum() for row in usage]
+
+# The same forecasts from forecast.py's single least-squares pass
+def case_forecast_batched(size, workdir):
+    import forecast
+    sim = load_simulator()
+    with simulator_config(sim, NUM_HOUSEHOLDS=size * 2 // 3, NUM_BUSINESSES=size // 3):
+        entities, types, usage = forecast.simulate_usage_matrix(seed=0)
+    return lambda: forecast.forecast_entities(entities, types, usage, horizon=30)
+
+# Cold start of satya<size>.py (size is the app number): fails when the default
+# page imports a heavy page-only dependency or exceeds the startup budget
+def case_app_startup(size, workdir):
+    import startup
+    def run():
+        measurement = startup.measure_startup(f"satya{size}.py")
+        problems = startup.budget_problems(measurement)
+        if problems:
+            raise AssertionError("; ".join(problems))
+        return measurement
+    return run
+
+# Bill-entry form submit: read the whole workbook, append one row, rewrite it
+def case_excel_bill_append(size, workdir):
+    path = os.path.join(workdir, f"bills_{size}.xlsx")
+    make_bills(size).to_excel(path, index=False)
+    new_data = {"Month": 1, "Category": "Electricity", "Amount": 120.0, "Description": "", "Type": "Household"}
+    def run():
+        bills_df = pd.read_excel(path)
+        bills_df = pd.concat([bills_df, pd.DataFrame([new_data])], ignore_index=True)
+        bills_df.to_excel(path, index=False)
+    return run
+
+# Point the storage layer at the scratch directory while stores are opened
+@contextmanager
+def bench_storage(workdir):
+    import storage
+    with simulator_config(storage, SQLITE_PATH=os.path.join(workdir, "bench.db"), COLUMNAR_DIR=os.path.join(workdir, "columnar")):
+        yield storage
+
+# Function to open a store in the scratch directory filled with `size` bills
+def open_bench_store(backend, size, workdir, index=()):
+    with bench_storage(workdir) as storage:
+        store = storage.open_store(os.path.join(workdir, f"bills_{backend}_{size}.xlsx"), list(make_bills(0).columns), backend=backend, index=index)
+    store.replace(make_bills(size))
+    return store
+
+# The same submit against the append-friendly stores in storage.py
+def case_sqlite_bill_append(size, workdir):
+    store = open_bench_store("sqlite", size, workdir)
+    return lambda: store.append({"Month": 1, "Category": "Electricity", "Amount": 120.0, "Description": "", "Type": "Household"})
+
+def case_columnar_bill_append(size, workdir):
+    store = open_bench_store("columnar", size, workdir)
+    return lambda: store.append({"Month": 1, "Category": "Electricity", "Amount": 120.0, "Description": "", "Type": "Household"})
+
+# N bill-form submits from 8 sessions at once into a 1000-bill workbook,
+# through the write-behind buffer: each submit is one fsynced log line, and
+# the workbook is rewritten once per group commit (see writebuffer.py)
+def case_buffered_bill_inserts(size, workdir):
+    import threading
+    import writebuffer
+    store = open_bench_store("excel", 1000, workdir)
+    new_data = {"Month": 1, "Category": "Electricity", "Amount": 120.0, "Description": "", "Type": "Household"}
+    def run():
+        store.replace(make_bills(1000))
+        buffer = writebuffer.WriteBuffer(store, log_dir=os.path.join(workdir, "wal"))
+        sessions = [threading.Thread(target=lambda: [buffer.submit(new_data) for _ in range(size // 8)]) for _ in range(8)]
+        for session in sessions:
+            session.start()
+        for session in sessions:
+            session.join()
+        buffer.close()
+        assert store.count() == 1000 + size // 8 * 8, "bills were lost"
+    return run
+
+# Bulk import of a CSV export of N bills into the indexed SQLite store, in
+# BATCH_ROWS batches with validation (see ingest.py)
+def case_bulk_ingest(size, workdir):
+    import ingest
+    path = os.path.join(workdir, f"bulk_{size}.csv")
+    make_bills(size).to_csv(path, index=False)
+    store = open_bench_store("sqlite", 0, workdir, index=ingest.SCHEMAS["bills"]["index"])
+    def run():
+        stats = ingest.ingest(path, store, "bills", restart=True, checkpoint_dir=os.path.join(workdir, "ingest"))
+        assert stats["loaded"] == size, "rows were rejected"
+    return run
+
+# A page rerun reading the bills through the shared cache (hit path)
+def case_cached_bill_read(size, workdir):
+    from datacache import DataCache
+    store = open_bench_store("sqlite", size, workdir)
+    cache = DataCache()
+    cache.read(store)
+    return lambda: cache.read(store)
+
+# The same on the columnar store, with rows waiting in its tail: every rerun
+# must still be a cache hit, i.e. reads leave the store's signature alone
+def case_cached_columnar_read(size, workdir):
+    from datacache import DataCache
+    store = open_bench_store("columnar", size, workdir)
+    store.append(make_bills(10, seed=1))
+    cache = DataCache()
+    cache.read(store)
+    def run():
+        hits = cache.stats()["hits"]
+        cache.read(store)
+        assert cache.stats()["hits"] == hits + 1, "columnar read missed the cache"
+    return run
+
+# Many small page reads (the cheapest timed store call), with the timing layer
+# off and on: the difference is what metrics.py costs per call
+def _page_reads(size, workdir, enabled):
+    import metrics
+    store = open_bench_store("sqlite", 10000, workdir)
+
+    def run():
+        metrics.enable(enabled)
+        try:
+            for i in range(size):
+                store.read_page(offset=i % 200 * 50, limit=50)
+        finally:
+            metrics.enable(False)
+            metrics.registry.reset()
+    return run
+
+def case_page_reads_metrics_off(size, workdir):
+    return _page_reads(size, workdir, False)
+
+def case_page_reads_metrics_on(size, workdir):
+    return _page_reads(size, workdir, True)
+
+# The Reports page's bill table as it used to be sent: every row, every run
+def case_bills_table_full(size, workdir):
+    from datacache import DataCache
+    store = open_bench_store("sqlite", size, workdir)
+    cache = DataCache()
+    return lambda: cache.read(store).to_dict("list")
+
+# The paged table: the next 50-row page, sorted by Amount, seeking from the
+# previous page's last row near the end of the table, and the filtered total
+# from the cached rollup as the pages count it
+def case_bills_table_page(size, workdir):
+    import reports
+    from datacache import DataCache
+    store = open_bench_store("sqlite", size, workdir, index=["Month", "Category", "Type", "Amount"])
+    cache = DataCache()
+    previous = store.read_page(50, max(size - 100, 0), order_by="Amount", descending=True)
+    after = (previous["Amount"].iloc[-1], previous.index[-1])
+    def run():
+        page = store.read_page(50, order_by="Amount", descending=True, after=after)
+        return page.to_dict("list"), cache.view(store, reports.BillRollup).count({"Category": "Gas"})
+    return run
+
+# satya.py's month-range filter as it was: a boolean mask over every bill
+def case_month_range_mask(size, workdir):
+    bills = make_bills(size)
+    return lambda: bills[(bills["Month"] >= 3) & (bills["Month"] <= 4) & (bills["Category"] == "Gas")]
+
+# The same filter as one slice of the (Month, Category, Type) index; checks
+# that both return the same bills
+def case_month_range_index(size, workdir):
+    from billindex import BillIndex
+    bills = make_bills(size)
+    bill_index = BillIndex(bills)
+    expected = bills[(bills["Month"] >= 3) & (bills["Month"] <= 4) & (bills["Category"] == "Gas")]
+    found = bill_index.query({"Month": (3, 4), "Category": "Gas"})
+    assert sorted(found.index) == list(expected.index), "index and mask disagree"
+    return lambda: bill_index.query({"Month": (3, 4), "Category": "Gas"})
+
+# Keeping the index sorted: one bill inserted at its place
+def case_bill_index_insert(size, workdir):
+    from billindex import BillIndex
+    bill_index = BillIndex(make_bills(size))
+    new_bill = pd.DataFrame([{"Month": 3, "Category": "Gas", "Amount": 120.0, "Description": "", "Type": "Household"}])
+    def run():
+        new_bill.index = [len(bill_index)]
+        bill_index.append(new_bill)
+    return run
+
+# Graphical Reports page (satya3) with nothing cached: the rollup is built
+# from all N bills, then the per-Type monthly totals read from it
+def case_reports_aggregation(size, workdir):
+    import reports
+    bills = make_bills(size)
+    return lambda: reports.monthly_totals_by_type(reports.BillRollup(bills))
+
+# The page as served between inserts: one bill is added through the cache,
+# which folds it into the cached rollup, and the tables are read from it
+def case_reports_rollup(size, workdir):
+    import reports
+    from datacache import DataCache
+    store = open_bench_store("sqlite", size, workdir)
+    cache = DataCache()
+    cache.view(store, reports.BillRollup)
+    def run():
+        cache.append(store, {"Month": 1, "Category": "Electricity", "Amount": 120.0, "Description": "", "Type": "Household"})
+        rollup = cache.view(store, reports.BillRollup)
+        return rollup.table(), reports.monthly_totals_by_type(rollup)
+    return run
+
+# N live readings from 1000 appliances, as the server gets them: parsed from
+# protocol lines a network read at a time into the ring buffers, then one
+# snapshot of every window (see readings.py)
+def case_reading_ingest(size, workdir):
+    import readings
+    rng = np.random.default_rng(0)
+    names = np.array([f"Appliance_{i+1}" for i in range(1000)], dtype=object)
+    data = readings.render_lines(names[np.arange(size) % 1000], 1.76e9 + np.arange(size) / 1e5, rng.uniform(0, 5, size))
+    chunks, start = [], 0
+    while start < len(data):
+        end = data.rfind(b"\n", start, start + readings.CHUNK_BYTES) + 1
+        chunks.append(data[start:end])
+        start = end
+    def run():
+        windows = readings.ReadingWindows()
+        for chunk in chunks:
+            windows.add(*readings.parse_lines(chunk))
+        assert windows.received == size and len(windows.snapshot()) == 1000
+    return run
+
+# One monitoring cycle over N appliances as the pages originally ran it, writing
+# the workbook after every row; kept as the baseline. Alerts are counted, not emailed
+def case_appliance_monitoring(size, workdir):
+    path = os.path.join(workdir, f"appliances_{size}.xlsx")
+    appliance_data_df = make_appliances(size)
+    appliance_data_df.to_excel(path, index=False)
+    def run():
+        alerts = 0
+        for index, row in appliance_data_df.iterrows():
+            today = datetime.today()
+            start_time = datetime.strptime(row["Start Time"], "%H:%M")
+            start_datetime = datetime.combine(today, start_time.time())
+            total_hours = max((datetime.now() - start_datetime).total_seconds() / 3600, 0)
+            total_volts = round(row["Kilovolts (kV)"] * total_hours, 2)
+            if total_volts > row["Max Limit (kV)"]:
+                alerts += 1
+            appliance_data_df.at[index, "Total Volts"] = total_volts
+            appliance_data_df.to_excel(path, index=False)
+        return alerts
+    return run
+
+# The same cycle as the pages now run it: one vectorized pass, one batched write
+def case_appliance_monitoring_vectorized(size, workdir):
+    from datacache import DataCache
+    from monitoring import run_monitoring_cycle
+    with bench_storage(workdir) as storage:
+        store = storage.open_store(os.path.join(workdir, f"appliances_{size}.xlsx"), list(make_appliances(0).columns), backend="sqlite")
+    store.replace(make_appliances(size))
+    cache = DataCache()
+    return lambda: run_monitoring_cycle(store, cache)
+
+# Electricity Bill Prediction page (satya3): overall, Household and Business fits
+def case_bill_prediction(size, workdir):
+    import prediction
+    from billindex import BillIndex
+    bill_index = BillIndex(make_bills(size))
+    return lambda: prediction.predict_by_type(bill_index, cache=None)
+
+# The same page served from a model cache warmed by an earlier run (e.g. before
+# an app restart): the models are loaded from disk, not refitted
+def case_bill_prediction_cached(size, workdir):
+    import prediction
+    from billindex import BillIndex
+    bill_index = BillIndex(make_bills(size))
+    cache_dir = os.path.join(workdir, f"models_{size}")
+    expected = prediction.predict_by_type(bill_index, cache=prediction.ModelCache(cache_dir))
+    def run():
+        predictions = prediction.predict_by_type(bill_index, cache=prediction.ModelCache(cache_dir))
+        assert all(cached for _, _, cached in predictions.values()), "models were refitted"
+        assert predictions == {name: (month, amount, True) for name, (month, amount, _) in expected.items()}
+        return predictions
+    return run
+
+# A day of limit checks every 15 minutes over N appliances, evaluating all of
+# them each time as a fixed-interval poll does. Returns the alerts raised
+def case_limit_polling(size, workdir):
+    from monitoring import evaluate_appliances
+    appliance_data_df = make_appliances(size)
+    day = pd.Timestamp.now().normalize()
+    def run():
+        alerted = pd.Series(False, index=appliance_data_df.index)
+        for step in range(1, 97):
+            _, over_limit = evaluate_appliances(appliance_data_df, day + pd.Timedelta(minutes=15 * step))
+            alerted |= over_limit
+        return int(alerted.sum())
+    return run
+
+# The same day with the limit scheduler: crossings computed once, then each
+# check only pops and evaluates the appliances that are due
+def case_limit_scheduler(size, workdir):
+    from monitoring import LimitScheduler, evaluate_appliances
+    appliance_data_df = make_appliances(size)
+    day = pd.Timestamp.now().normalize()
+    def run():
+        scheduler = LimitScheduler()
+        scheduler.sync(appliance_data_df, day)
+        alerted = 0
+        for step in range(1, 97):
+            now = day + pd.Timedelta(minutes=15 * step)
+            due = [row_id for row_id, _ in scheduler.pop_due(now)]
+            if due:
+                alerted += int(evaluate_appliances(appliance_data_df.loc[due], now)[1].sum())
+        return alerted
+    return run
+
+# Function to start (once) the local SMTP stand-in the alert cases send to
+_smtp_server = None
+def bench_smtp_server():
+    global _smtp_server
+    if _smtp_server is None:
+        from mailer import LocalSMTPServer
+        _smtp_server = LocalSMTPServer().start()
+    return _smtp_server
+
+# Alerts for N over-limit appliances as the pages used to send them: one
+# connection (and login) per email
+def case_alert_send_per_message(size, workdir):
+    import mailer
+    server = bench_smtp_server()
+    def run():
+        with simulator_config(mailer, SMTP_HOST="127.0.0.1", SMTP_PORT=server.port, SMTP_PLAINTEXT=True):
+            for i in range(size):
+                mailer.send_email(f"Alert {i}", "Over limit", f"user{i}@example.com")
+    return run
+
+# The same alerts through the pooled outbox, each submitted twice: the repeats
+# must be suppressed and every first alert delivered exactly once
+def case_alert_outbox(size, workdir):
+    import mailer
+    server = bench_smtp_server()
+    def run():
+        before = len(server.messages)
+        with simulator_config(mailer, SMTP_HOST="127.0.0.1", SMTP_PORT=server.port, SMTP_PLAINTEXT=True):
+            outbox = mailer.Outbox(log_path=None)
+            for _ in range(2):
+                for i in range(size):
+                    outbox.submit(f"Alert {i}", "Over limit", f"user{i}@example.com", key=mailer.alert_key(f"Appliance_{i}", f"user{i}@example.com"))
+            outbox.close()
+        stats = outbox.stats()
+        if stats["sent"] != size or stats["suppressed"] != size or len(server.messages) - before != size:
+            raise AssertionError(f"Outbox delivered {stats} for {size} alerts")
+        return stats
+    return run
+
+CASES = {name[len("case_"):]: func for name, func in globals().items() if name.startswith("case_")}
+
+# ---- HARNESS ----
+
+# Function to time a case: one warm-up call, then `repeat` timed calls
+def time_case(run, repeat):
+    run()
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+# Function to measure the peak traced allocation of one call, in MB
+def peak_memory(run):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1e6
+
+# Slope of log(time) against log(size): ~1 is linear, ~2 quadratic
+def scaling_exponent(sizes, seconds):
+    if len(sizes) < 2 or min(seconds) <= 0:
+        return None
+    return float(np.polyfit(np.log(sizes), np.log(seconds), 1)[0])
+
+def run_benchmarks(names, quick=False, repeat=3, workdir=None):
+    results = {}
+    workdir = workdir or tempfile.mkdtemp(prefix="sems-bench-")
+    try:
+        for name in names:
+            sizes = SIZES[name][1 if quick else 0]
+            entry = {"sizes": sizes, "median_s": [], "min_s": [], "peak_mb": []}
+            for size in sizes:
+                run = CASES[name](size, workdir)
+                samples = time_case(run, repeat)
+                entry["median_s"].append(statistics.median(samples))
+                entry["min_s"].append(min(samples))
+                entry["peak_mb"].append(round(peak_memory(run), 2))
+                print(f"{name:<32}{size:>10}{statistics.median(samples):>12.4f}s{entry['peak_mb'][-1]:>10.1f} MB")
+            entry["scaling_exponent"] = scaling_exponent(sizes, entry["median_s"])
+            results[name] = entry
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "quick": quick,
+            "repeat": repeat,
+        },
+        "cases": results,
+    }
+
+# Function to compare two result files; returns the regressions found
+def compare_results(current, baseline, threshold):
+    regressions = []
+    print(f"\n{'case':<32}{'size':>10}{'before':>12}{'after':>12}{'ratio':>8}")
+    for name, entry in current["cases"].items():
+        old = baseline.get("cases", {}).get(name)
+        if not old:
+            continue
+        old_times = dict(zip(old["sizes"], old["median_s"]))
+        for size, seconds in zip(entry["sizes"], entry["median_s"]):
+            if size not in old_times:
+                continue
+            ratio = seconds / old_times[size] if old_times[size] else float("inf")
+            flag = "  REGRESSION" if ratio > threshold else ""
+            print(f"{name:<32}{size:>10}{old_times[size]:>12.4f}{seconds:>12.4f}{ratio:>8.2f}{flag}")
+            if flag:
+                regressions.append((name, size, ratio))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the headless performance benchmarks.")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="run only these cases")
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a fast smoke run")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per size")
+    parser.add_argument("--out", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only or list(CASES), quick=args.quick, repeat=args.repeat)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} benchmark(s) slower than {args.threshold}x the baseline")
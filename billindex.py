@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+import metrics
+from storage import filter_frame
+
+# Bills kept sorted by (Month, Category, Type), for the Reports and Prediction
+# pages. The pages get one through data_cache.view(store, BillIndex), which
+# builds it once and inserts each new bill at its place in the order, so a
+# query never scans the table: month ranges and Category/Type values map to a
+# few contiguous slices found by binary search, O(log n + k) for k rows.
+#
+# The sort key packs the three columns into one int64, month in the high
+# bits and Category/Type codes below it. Codes are given out as values are
+# first seen (0 is a missing value), so they group rows but do not sort them
+# alphabetically; rows with equal keys stay in insertion order.
+
+KEY_BITS = 16  # room for 65535 categories and types
+KEY_MASK = (1 << KEY_BITS) - 1
+
+# Month, Category and Type are read back out of the key, so only the other
+# columns are stored, each as one numpy array in key order (numeric columns
+# keep their dtype, which keeps inserts a plain memmove).
+class BillIndex:
+    KEYS = ("Month", "Category", "Type")
+
+    def __init__(self, bills_df):
+        self.labels = {column: [None] for column in self.KEYS[1:]}  # code -> value
+        self.codes = {column: {} for column in self.KEYS[1:]}  # value -> code
+        self.columns = list(bills_df.columns)
+        keys = self._encode(bills_df)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.row_ids = bills_df.index.to_numpy()[order]
+        self.data = {column: bills_df[column].to_numpy()[order] for column in self.columns if column not in self.KEYS}
+        self.index_name = bills_df.index.name
+
+    # Function to compute the sort key of each row
+    def _encode(self, df):
+        keys = np.zeros(len(df), dtype=np.int64)
+        if "Month" in df:
+            keys |= pd.to_numeric(df["Month"], errors="coerce").fillna(0).to_numpy(dtype=np.int64) << (2 * KEY_BITS)
+        for shift, column in ((KEY_BITS, "Category"), (0, "Type")):
+            if column in df:
+                keys |= self._codes_of(column, df[column]) << shift
+        return keys
+
+    def _codes_of(self, column, values):
+        codes, labels = self.codes[column], self.labels[column]
+        inverse, uniques = pd.factorize(values)
+        for value in uniques:
+            if value not in codes:
+                codes[value] = len(labels)
+                labels.append(value)
+        mapped = np.array([codes[value] for value in uniques] + [0], dtype=np.int64)
+        return mapped[inverse]  # the missing-value code -1 picks the trailing 0
+
+    # Function to insert newly added bills at their place in the order
+    def append(self, new_rows):
+        keys = self._encode(new_rows)
+        order = np.argsort(keys, kind="stable")
+        positions = np.searchsorted(self.keys, keys[order], side="right")
+        self.keys = np.insert(self.keys, positions, keys[order])
+        self.row_ids = np.insert(self.row_ids, positions, new_rows.index.to_numpy()[order])
+        for column in new_rows.columns:
+            if column not in self.columns:
+                self.columns.append(column)
+                if column not in self.KEYS:
+                    self.data[column] = np.full(len(self.keys) - len(keys), None, dtype=object)
+        for column, stored in self.data.items():
+            if column in new_rows:
+                values = new_rows[column].to_numpy()[order]
+            else:
+                values = np.full(len(keys), None, dtype=object)
+            if stored.dtype != values.dtype and not (stored.dtype.kind in "iufb" and values.dtype.kind in "iufb"):
+                stored, values = stored.astype(object), values.astype(object)
+            elif stored.dtype != values.dtype:
+                dtype = np.result_type(stored.dtype, values.dtype)
+                stored, values = stored.astype(dtype), values.astype(dtype)
+            self.data[column] = np.insert(stored, positions, values)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Function to find the key ranges [low, high) holding the rows that match
+    # the Month/Category/Type filters; None when a filter cannot use the key
+    def _ranges(self, where):
+        month = where.get("Month")
+        if isinstance(month, tuple):
+            first, last = month
+        elif month is not None:
+            first = last = month
+        else:
+            first, last = 0, int(self.keys[-1] >> (2 * KEY_BITS)) if len(self.keys) else 0
+        months = np.arange(int(np.ceil(first)), int(np.floor(last)) + 1, dtype=np.int64)
+        prefixes = months << (2 * KEY_BITS)
+        category, bill_type = where.get("Category"), where.get("Type")
+        if isinstance(category, tuple) or isinstance(bill_type, tuple):
+            return None
+        if category is None and bill_type is None:
+            return prefixes, prefixes + (1 << (2 * KEY_BITS))
+        if category is not None:
+            if category not in self.codes["Category"]:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            prefixes = prefixes + (self.codes["Category"][category] << KEY_BITS)
+        else:
+            categories = np.array([0] + list(self.codes["Category"].values()), dtype=np.int64)
+            prefixes = (prefixes[:, None] + (categories[None, :] << KEY_BITS)).ravel()
+        if bill_type is None:
+            return prefixes, prefixes + (1 << KEY_BITS)
+        if bill_type not in self.codes["Type"]:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        prefixes = prefixes + self.codes["Type"][bill_type]
+        return prefixes, prefixes + 1
+
+    # Function to return the positions (in sorted order) of rows matching the
+    # key filters, as a concatenation of slices; None when they need a scan
+    def _positions(self, where):
+        ranges = self._ranges(where)
+        if ranges is None:
+            return None
+        starts = np.searchsorted(self.keys, ranges[0], side="left")
+        stops = np.searchsorted(self.keys, ranges[1], side="left")
+        lengths = stops - starts
+        if not lengths.sum():
+            return np.zeros(0, dtype=np.int64)
+        # Concatenate the slices without a Python loop: start + 0..length-1 each
+        keep = lengths > 0
+        starts, lengths = starts[keep], lengths[keep]
+        offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        return offsets + np.arange(lengths.sum())
+
+    # Function to return the bills matching filters as in storage.py
+    # ({column: value} or {column: (low, high)}), sorted by Month, Category
+    # and Type. Filters on other columns are applied to the matching rows only.
+    @metrics.instrumented("index_query", rows=lambda result, *args, **kwargs: len(result))
+    def query(self, where=None, columns=None):
+        where = where or {}
+        positions = self._positions({k: v for k, v in where.items() if k in self.KEYS})
+        if positions is None:
+            positions, rest = np.arange(len(self.keys)), where
+        else:
+            rest = {k: v for k, v in where.items() if k not in self.KEYS}
+        columns = columns or self.columns
+        keys = self.keys[positions]
+        values = {}
+        for column in columns:
+            if column == "Month":
+                months = (keys >> (2 * KEY_BITS)).astype(np.float64)
+                months[months == 0] = np.nan
+                values[column] = months if np.isnan(months).any() else months.astype(np.int64)
+            elif column in self.KEYS:
+                codes = (keys >> (KEY_BITS if column == "Category" else 0)) & KEY_MASK
+                values[column] = np.array(self.labels[column], dtype=object)[codes]
+            else:
+                values[column] = self.data[column][positions]
+        df = pd.DataFrame(values, index=pd.Index(self.row_ids[positions], name=self.index_name)).infer_objects()
+        return filter_frame(df, rest)
+
+    # Function to count the bills matching Month/Category/Type filters
+    def count(self, where=None):
+        where = where or {}
+        positions = None if any(column not in self.KEYS for column in where) else self._positions(where)
+        if positions is None:
+            return len(self.query(where, list(where)))
+        return len(positions)
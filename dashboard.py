@@ -0,0 +1,195 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Headless charts of the energy simulator's output (sai.txt). Figures are
+# drawn on matplotlib's Agg/SVG canvases without pyplot, so nothing needs a
+# display or blocks, and any number of views can be saved in one run:
+#
+#   python sai.txt --intervals intervals --seed 1
+#   python dashboard.py intervals --out charts --months --entities Household_1 Business_1 --format png svg
+#
+# Each chart shows the total with an overlay per Type, and optionally a panel
+# of individual entities, over the whole year or a zoomed window. Every line
+# is reduced to at most one point per pixel column before it is drawn
+# (min/max bucketing, or LTTB), so the cost of drawing depends on the image
+# width, not on how many readings or entities there are. The totals come from
+# the rollups the simulator keeps (EnergyRollups, IntervalData.type_totals);
+# entity lines are views of the interval file.
+
+WIDTH_PX = 1200  # default image width; lines keep at most this many points
+DPI = 100
+
+# Function to pick points of a long series that keep its shape: the lowest
+# and highest value of each of about max_points // 2 equal buckets, in order
+def minmax_indices(values, max_points):
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    size = -(-n // max(max_points // 2 - 1, 1))  # ceil, leaving room for the end points
+    buckets = -(-n // size)
+    # The last bucket is padded with the last value; its picks are clipped back
+    padded = np.concatenate([values, np.repeat(values[-1:], buckets * size - n)]).reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    picks = np.concatenate([offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1), [0, n - 1]])
+    return np.unique(np.minimum(picks, n - 1))
+
+# Function to pick max_points points of a series by Largest-Triangle-Three-
+# Buckets: the first and last point, then from each bucket the point making
+# the largest triangle with the previous pick and the next bucket's mean
+def lttb_indices(values, max_points):
+    n = len(values)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    picks = np.empty(max_points, dtype=np.int64)
+    picks[0], picks[-1] = 0, n - 1
+    previous = 0
+    for i in range(max_points - 2):
+        low, high = edges[i], edges[i + 1]
+        next_high = edges[i + 2] if i + 2 < len(edges) else n
+        mean_x, mean_y = x[high:next_high].mean(), y[high:next_high].mean()
+        area = np.abs((x[previous] - mean_x) * (y[low:high] - y[previous])
+                      - (x[previous] - x[low:high]) * (mean_y - y[previous]))
+        previous = low + int(area.argmax())
+        picks[i + 1] = previous
+    return picks
+
+DOWNSAMPLERS = {"minmax": minmax_indices, "lttb": lttb_indices}
+
+# Function to reduce a series (pandas, time-indexed) to at most max_points
+def downsample(series, max_points=WIDTH_PX, method="minmax"):
+    return series.iloc[DOWNSAMPLERS[method](series.to_numpy(), max_points)]
+
+# Function to get the usage of each Type over time from a data source, as a
+# time-indexed frame with one column per Type, and the y-axis label.
+# Interval data is in kW (kWh per interval / interval hours); daily data in kWh.
+def type_frame(data):
+    if hasattr(data, "totals_by_type"):  # IntervalData
+        return data.totals_by_type() / data.interval_hours, "Demand (kW)"
+    if hasattr(data, "daily_totals_by_type"):  # EnergyRollups
+        df = data.daily_totals_by_type()
+    elif isinstance(data, pd.Series):  # daily totals only
+        df = data.to_frame("Total")
+    elif "Day" in data.columns:  # compact frame
+        start = data.attrs["start_date"]
+        df = data.pivot_table(index="Day", columns="Type", values="Energy_Usage_kWh", aggfunc="sum", observed=True)
+        df.index = [start + pd.Timedelta(days=int(day)) for day in df.index]
+    else:
+        df = data.pivot_table(index="Date", columns="Type", values="Energy_Usage_kWh", aggfunc="sum")
+    df.index = pd.DatetimeIndex(df.index, name="Date")
+    return df, "Energy (kWh per day)"
+
+# Function to get one entity's usage between start and end as a time-indexed
+# series; for interval data only the window's part of the row is read
+def entity_series(data, name, start=None, end=None):
+    if hasattr(data, "entity"):  # IntervalData
+        times = data.times()
+        first = 0 if start is None else int(np.searchsorted(times, np.datetime64(pd.Timestamp(start), "m")))
+        last = len(times) if end is None else int(np.searchsorted(times, np.datetime64(pd.Timestamp(end), "m"), side="right"))
+        row = data.entity(name)[first:last]
+        return pd.Series(row / data.interval_hours, index=pd.DatetimeIndex(times[first:last]), name=name)
+    if not isinstance(data, pd.DataFrame):
+        raise ValueError("Entity overlays need interval data or the full simulation frame")
+    rows = data[data["Entity"] == name]
+    if "Day" in rows.columns:
+        index = [data.attrs["start_date"] + pd.Timedelta(days=int(day)) for day in rows["Day"]]
+    else:
+        index = rows["Date"]
+    series = pd.Series(rows["Energy_Usage_kWh"].to_numpy(np.float64), index=pd.DatetimeIndex(index), name=name)
+    return series.loc[start:end]
+
+# Function to draw one chart: total and per-Type usage, plus a panel of
+# entities when given, between start and end (the whole period by default).
+# Saved to out; the format follows its extension (.png, .svg, .pdf).
+def render_dashboard(data, out, entities=(), start=None, end=None, width_px=WIDTH_PX, method="minmax", title=None):
+    from matplotlib.figure import Figure
+
+    types, unit = type_frame(data)
+    types = types.loc[start:end]
+    panels = 2 if entities else 1
+    fig = Figure(figsize=(width_px / DPI, 4 * panels), dpi=DPI)
+    axes = fig.subplots(panels, 1, sharex=True, squeeze=False)[:, 0]
+
+    # Roughly one point per pixel column of the plotting area
+    max_points = int(width_px * 0.85)
+    total = types.sum(axis=1)
+    axes[0].plot(*_xy(downsample(total, max_points, method)), label="Total", color="black", linewidth=1.2)
+    if types.shape[1] > 1:
+        for column in types.columns:
+            axes[0].plot(*_xy(downsample(types[column], max_points, method)), label=column, linewidth=0.8)
+    axes[0].set_title(title or _title(total))
+    axes[0].set_ylabel(unit)
+    axes[0].legend(loc="upper right", fontsize="small")
+    if entities:
+        for name in entities:
+            series = entity_series(data, name, start, end)
+            axes[1].plot(*_xy(downsample(series, max_points, method)), label=name, linewidth=0.8)
+        axes[1].set_title("Entities")
+        axes[1].set_ylabel(unit)
+        axes[1].legend(loc="upper right", fontsize="small")
+    axes[-1].set_xlabel("Date")
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    fig.savefig(out)
+    return out
+
+def _xy(series):
+    return series.index.to_numpy(), series.to_numpy()
+
+def _title(total):
+    if not len(total):
+        return "Energy Consumption"
+    return f"Energy Consumption, {total.index[0]:%Y-%m-%d} to {total.index[-1]:%Y-%m-%d}"
+
+# Function to list the views for a batch export: the whole period, and with
+# months=True each calendar month zoomed in, as (name, start, end)
+def year_views(data, months=False):
+    index = type_frame(data)[0].index
+    views = [("year", None, None)]
+    if months and len(index):
+        for month in pd.period_range(index[0], index[-1], freq="M"):
+            views.append((f"{month}", month.start_time, month.end_time))
+    return views
+
+# Function to render every view in every format into out_dir; returns the paths
+def export_dashboards(data, out_dir, views, formats=("png",), entities=(), width_px=WIDTH_PX, method="minmax"):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, start, end in views:
+        for fmt in formats:
+            path = os.path.join(out_dir, f"dashboard-{name}.{fmt}")
+            paths.append(render_dashboard(data, path, entities, start, end, width_px, method))
+    return paths
+
+if __name__ == "__main__":
+    from simulator import load_simulator
+
+    parser = argparse.ArgumentParser(description="Render energy dashboards headless, for an interval simulation or a fresh daily one.")
+    parser.add_argument("intervals", nargs="?", default=None, help="directory written by sai.txt --intervals (default: simulate daily rollups)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the daily simulation")
+    parser.add_argument("--out", default="charts", help="directory to save the charts in")
+    parser.add_argument("--format", nargs="+", default=["png"], choices=["png", "svg", "pdf"])
+    parser.add_argument("--entities", nargs="*", default=[], help="entities to overlay (interval data only)")
+    parser.add_argument("--months", action="store_true", help="also save a zoomed view of every month")
+    parser.add_argument("--start", default=None, help="save a single view starting at this date")
+    parser.add_argument("--end", default=None, help="end of the single view")
+    parser.add_argument("--width", type=int, default=WIDTH_PX, help="image width in pixels")
+    parser.add_argument("--method", choices=sorted(DOWNSAMPLERS), default="minmax")
+    args = parser.parse_args()
+
+    sim = load_simulator()
+    data = sim.IntervalData(args.intervals) if args.intervals else sim.simulate_energy_rollups(seed=args.seed)
+    if args.start or args.end:
+        views = [(f"{args.start or 'start'}_{args.end or 'end'}", args.start, args.end)]
+    else:
+        views = year_views(data, args.months)
+    started = time.perf_counter()
+    paths = export_dashboards(data, args.out, views, args.format, args.entities, args.width, args.method)
+    elapsed = time.perf_counter() - started
+    print(f"Saved {len(paths)} charts to {args.out} in {elapsed:.2f}s ({elapsed / max(len(paths), 1):.3f}s each)")
@@ -0,0 +1,161 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import filter_frame, to_frame
+
+# Process-wide cache of store contents shared by every Streamlit session and
+# page. Entries are keyed by store and validated against store.signature()
+# (file mtime/size plus write counters), so a rerun that finds the data
+# unchanged reuses the parsed frame instead of reading the store again.
+# Writes made through append()/update() patch the cached frame rather than
+# dropping it (into a new frame: the old one may still be in use); any other
+# change to the underlying files shows up as a new signature and the next
+# read reloads.
+#
+# Derived views of a store (e.g. the Reports rollup) are cached alongside its
+# frame: view() builds one from the frame on first use, append() hands each
+# view the new rows so it can update itself, and anything that reloads or
+# edits the frame drops them to be rebuilt.
+class DataCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}  # id(store) -> (store, signature, frame)
+        self.views = {}  # id(store) -> {factory: view} for the current entry
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+
+    # Function to read a store through the cache; where is an equality filter.
+    # Callers get their own copy, so page code can add columns freely.
+    def read(self, store, where=None):
+        return filter_frame(self._frame(store)[1], where).copy()
+
+    # Function to return (signature, cached frame) for a store, loading it when
+    # stale. The frame is shared: callers must not modify it.
+    def _frame(self, store):
+        signature = store.signature()
+        with self.lock:
+            entry = self.entries.get(id(store))
+            if entry and entry[1] == signature:
+                self.hits += 1
+                return signature, entry[2]
+            self.misses += 1
+        frame = store.read()
+        with self.lock:
+            self.entries[id(store)] = (store, signature, frame)
+            self.views.pop(id(store), None)
+        return signature, frame
+
+    # Function to return factory's view of a store's data, e.g. a rollup. It
+    # is built as factory(frame) on first use and kept current by append();
+    # views are shared between sessions, so callers must not modify them.
+    def view(self, store, factory):
+        signature, frame = self._frame(store)
+        with self.lock:
+            view = self.views.get(id(store), {}).get(factory)
+            if view is not None:
+                return view
+        view = factory(frame)
+        with self.lock:
+            entry = self.entries.get(id(store))
+            if entry and entry[1] == signature:
+                self.views.setdefault(id(store), {})[factory] = view
+        return view
+
+    # Function to append rows to a store and to its cached frame
+    def append(self, store, records):
+        df = to_frame(records)
+        if df.empty:
+            return store.append(df)
+        row_ids = store.append(df)
+        before, after = write_signatures(store)
+        with self.lock:
+            entry = self.entries.get(id(store))
+            if entry and entry[1] == before and getattr(store, "patch_on_write", True):
+                frame = entry[2]
+                new_rows = df.set_axis(pd.Index(row_ids, name=frame.index.name))
+                columns = list(frame.columns) + [c for c in new_rows.columns if c not in frame.columns]
+                new_rows = new_rows.reindex(columns=columns)
+                frame = pd.concat([frame.reindex(columns=columns), new_rows])
+                self.entries[id(store)] = (store, after, frame)
+                try:
+                    for view in self.views.get(id(store), {}).values():
+                        view.append(new_rows)
+                except Exception:
+                    self.views.pop(id(store), None)  # rebuilt on next use
+                self.updates += 1
+            else:
+                self.entries.pop(id(store), None)
+                self.views.pop(id(store), None)
+        return row_ids
+
+    # Function to update one row in a store and in its cached frame
+    def update(self, store, row_id, values):
+        store.update(row_id, values)
+        self._patch(store, [row_id], {column: [value] for column, value in values.items()})
+
+    # Function to update many rows (values maps column -> one value per row id)
+    # in a store with one write, and in its cached frame
+    def update_rows(self, store, row_ids, values):
+        store.update_rows(row_ids, values)
+        self._patch(store, list(row_ids), values)
+
+    # Sessions may be reading the cached frame, so updated rows are patched
+    # into copies of the changed columns, and the entry swapped for the result
+    def _patch(self, store, row_ids, values):
+        before, after = write_signatures(store)
+        with self.lock:
+            entry = self.entries.pop(id(store), None)
+            self.views.pop(id(store), None)
+            if not (entry and entry[1] == before and getattr(store, "patch_on_write", True)):
+                return
+            frame = entry[2]
+            if not pd.Index(row_ids).isin(frame.index).all():
+                return  # reload on next read
+            columns = {}
+            try:
+                for column, column_values in values.items():
+                    patched = frame[column].copy() if column in frame else pd.Series(None, index=frame.index, dtype=object)
+                    if patched.dtype.kind in "iub" and np.asarray(column_values).dtype.kind == "f":
+                        patched = patched.astype(float)
+                    patched.loc[row_ids] = list(column_values)
+                    columns[column] = patched
+            except (TypeError, ValueError, KeyError):
+                return  # e.g. text into a numeric column: reload on next read
+            self.entries[id(store)] = (store, after, frame.assign(**columns))
+            self.updates += 1
+
+    # Function to drop one store's entry, or everything
+    def invalidate(self, store=None):
+        with self.lock:
+            if store is None:
+                self.entries.clear()
+                self.views.clear()
+            else:
+                self.entries.pop(id(store), None)
+                self.views.pop(id(store), None)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "in_place_updates": self.updates,
+                "entries": len(self.entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+# Function to return a store's signatures just before and just after this
+# thread's last write to it. A cached frame is only patched when it was
+# cached under the first: then the write was the only change in between, and
+# the patched frame is current as of the second. (None, None) when the store
+# cannot tell, which always reloads.
+def write_signatures(store):
+    signatures = getattr(store, "write_signatures", lambda: None)()
+    return signatures or (None, None)
+
+# The shared instance used by the apps
+data_cache = DataCache()
@@ -0,0 +1,124 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from simulator import load_simulator
+
+# Next-period consumption forecasts for every entity of the energy simulator
+# (sai.txt). Each entity gets its own linear trend of daily usage against the
+# day number, like the Prediction page's Amount-against-Month fit, but all
+# trends are solved in one least-squares pass over the (entities x days)
+# usage matrix instead of one sklearn fit per entity:
+#
+#   python forecast.py --seed 1 --horizon 30 --by-type
+#
+# Ordinary least squares is linear in the observations, so the forecast of a
+# Type's total usage equals the sum of its entities' forecasts; --by-type
+# reports those sums.
+
+# Function to simulate the usage matrix directly: (entities, types, usage) with
+# usage as (entities x days), from the same random streams as sai's
+# simulate_energy_consumption_vectorized
+def simulate_usage_matrix(seed=None):
+    sim = load_simulator()
+    sim.seed_simulation(seed)
+    h_entities, h_types, h_usage = sim.generate_entity_block('household', 0, sim.NUM_HOUSEHOLDS)
+    b_entities, b_types, b_usage = sim.generate_entity_block('business', 0, sim.NUM_BUSINESSES)
+    return h_entities + b_entities, h_types + b_types, np.concatenate([h_usage, b_usage])
+
+# Function to pivot a simulation frame (standard or compact schema) into
+# (entities, types, usage) without a pandas pivot: rows are placed by their
+# entity and day codes, in order of first appearance
+def usage_matrix(df):
+    entity_codes, entities = pd.factorize(df['Entity'])
+    if 'Day' in df.columns:
+        day_codes = df['Day'].to_numpy()
+        days = int(day_codes.max()) + 1 if len(day_codes) else 0
+    else:
+        day_codes, dates = pd.factorize(df['Date'], sort=True)
+        days = len(dates)
+    usage = np.full((len(entities), days), np.nan)
+    usage[entity_codes, day_codes] = df['Energy_Usage_kWh'].to_numpy(dtype=np.float64)
+    first_rows = np.unique(entity_codes, return_index=True)[1]
+    types = df['Type'].to_numpy()[first_rows].astype(object)
+    return list(entities.astype(object)), list(types), usage
+
+# Function to fit every row of usage (entities x days) at once: a degree-`degree`
+# polynomial trend in the day number, solved for all rows by one lstsq call on
+# the shared design matrix. Returns coefficients (entities x degree+1), lowest
+# order first, and the per-entity residual standard deviation.
+def fit_trends(usage, degree=1):
+    usage = np.asarray(usage, dtype=np.float64)
+    if np.isnan(usage).any():
+        raise ValueError("usage has missing days; every entity needs a value for every day")
+    days = usage.shape[1]
+    design = np.vander(np.arange(days, dtype=np.float64), degree + 1, increasing=True)
+    coefficients, _, _, _ = np.linalg.lstsq(design, usage.T, rcond=None)
+    residuals = usage - (design @ coefficients).T
+    dof = max(days - (degree + 1), 1)
+    return coefficients.T, np.sqrt((residuals ** 2).sum(axis=1) / dof)
+
+# Function to forecast each entity's consumption over the `horizon` days after
+# the simulated period. Returns one row per entity (or, with by_type, one per
+# Type) with the trend and the forecast total in kWh.
+def forecast_entities(entities, types, usage, horizon=30, degree=1, by_type=False):
+    coefficients, residual_std = fit_trends(usage, degree)
+    days = usage.shape[1]
+    future = np.vander(np.arange(days, days + horizon, dtype=np.float64), degree + 1, increasing=True)
+    forecast = (coefficients @ future.T).sum(axis=1)
+    table = pd.DataFrame({
+        'Entity': entities,
+        'Type': types,
+        'Trend_kWh_per_day': coefficients[:, 1] if degree >= 1 else 0.0,
+        'Last_Period_kWh': usage[:, -horizon:].sum(axis=1) if horizon <= days else usage.sum(axis=1),
+        'Forecast_kWh': forecast,
+        'Residual_Std_kWh': residual_std,
+    })
+    if by_type:
+        table = table.groupby('Type').agg(
+            Entities=('Entity', 'size'),
+            Trend_kWh_per_day=('Trend_kWh_per_day', 'sum'),
+            Last_Period_kWh=('Last_Period_kWh', 'sum'),
+            Forecast_kWh=('Forecast_kWh', 'sum'),
+        ).reset_index()
+    return table
+
+# Function to check the batched fits against one sklearn LinearRegression per
+# entity for a sample of rows (the loop this module replaces)
+def verify_against_sklearn(usage, horizon=30, sample=200, seed=0):
+    from sklearn.linear_model import LinearRegression
+    rows = np.random.default_rng(seed).choice(len(usage), min(sample, len(usage)), replace=False)
+    days = usage.shape[1]
+    X = np.arange(days).reshape(-1, 1)
+    future = np.arange(days, days + horizon).reshape(-1, 1)
+    expected = np.array([LinearRegression().fit(X, usage[row]).predict(future).sum() for row in rows])
+    coefficients, _ = fit_trends(usage[rows])
+    batched = (coefficients @ np.vander(future.ravel().astype(float), 2, increasing=True).T).sum(axis=1)
+    np.testing.assert_allclose(batched, expected, rtol=1e-9, atol=1e-6)
+    print(f"Batched forecasts match sklearn for {len(rows)} sampled entities.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast next-period consumption for every simulated entity.")
+    parser.add_argument("--seed", type=int, default=None, help="simulator seed")
+    parser.add_argument("--horizon", type=int, default=30, help="days to forecast after the simulated period")
+    parser.add_argument("--degree", type=int, default=1, help="degree of each entity's trend (1 = linear)")
+    parser.add_argument("--by-type", action="store_true", help="sum the forecasts by Type")
+    parser.add_argument("--verify", action="store_true", help="check a sample of entities against sklearn")
+    parser.add_argument("--out", default=None, help="write the forecast table to this CSV file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    entities, types, usage = simulate_usage_matrix(args.seed)
+    simulated = time.perf_counter()
+    table = forecast_entities(entities, types, usage, args.horizon, args.degree, args.by_type)
+    fitted = time.perf_counter()
+    print(f"Simulated {usage.shape[0]} entities x {usage.shape[1]} days in {simulated - start:.2f}s; "
+          f"fitted and forecast in {fitted - simulated:.2f}s")
+    if args.verify:
+        verify_against_sklearn(usage, args.horizon)
+    print(table.to_string(index=False) if args.by_type else table.head(20).to_string(index=False))
+    if args.out:
+        table.to_csv(args.out, index=False)
+        print(f"Wrote {len(table)} forecasts to {args.out}")
@@ -0,0 +1,287 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from storage import open_store, store_id
+
+# Bulk import of bills and meter readings from CSV or Parquet files, e.g. a
+# utility's export or the simulator's output (sai.txt, write_partitions):
+#
+#   python ingest.py bills utility_export.csv
+#   python ingest.py meter simulation_parts/ --batch-rows 200000
+#
+# Files are read BATCH_ROWS rows at a time and never held whole in memory.
+# Each batch is validated and coerced a column at a time; rows that fail are
+# counted and, with --rejects, written out with the reason. The valid rows go
+# to the store in one append per batch.
+#
+# Progress is checkpointed per file in INGEST_DIR after each batch, so an
+# interrupted import picks up where it stopped when run again. A batch that
+# was being appended at the time is checked against the store's row count: if
+# it landed it is skipped, otherwise it is read again. This assumes nothing
+# else writes to the store while the import runs. Running a finished import
+# again does nothing unless --restart is given.
+
+BATCH_ROWS = int(os.environ.get("SEMS_INGEST_BATCH", "100000"))  # rows read, checked and appended at a time
+INGEST_DIR = os.environ.get("SEMS_INGEST_DIR", "ingest_progress")  # checkpoint files
+
+# Column rules: type is int, float, str or date (stored as YYYY-MM-DD);
+# min/max bound numbers; a missing value takes the default if there is one,
+# and is otherwise an error unless the column is optional. Optional columns
+# without a default are only written when the file has them.
+SCHEMAS = {
+    # monthly_bills.xlsx (satya1/2/3; satya1 has no Type column)
+    "bills": {
+        "workbook": "monthly_bills.xlsx",
+        "index": ["Month", "Category", "Type", "Amount"],
+        "columns": {
+            "Month": {"type": "int", "min": 1, "max": 12},
+            "Category": {"type": "str"},
+            "Amount": {"type": "float", "min": 0},
+            "Description": {"type": "str", "default": ""},
+            "Type": {"type": "str", "optional": True},
+        },
+    },
+    # daily_data.xlsx (satya.py)
+    "daily": {
+        "workbook": "daily_data.xlsx",
+        "index": ["Month", "Category", "Amount"],
+        "columns": {
+            "Month": {"type": "int", "min": 1, "max": 12},
+            "Category": {"type": "str"},
+            "Amount": {"type": "float", "min": 0},
+            "Description": {"type": "str", "default": ""},
+            "Season": {"type": "str", "optional": True},
+        },
+    },
+    # Daily readings per entity, as simulated by sai.txt. Compact frames
+    # (a Day offset in place of Date) need --start-date.
+    "meter": {
+        "workbook": "energy_usage.xlsx",
+        "index": ["Entity"],
+        "columns": {
+            "Entity": {"type": "str"},
+            "Type": {"type": "str"},
+            "Date": {"type": "date"},
+            "Energy_Usage_kWh": {"type": "float", "min": 0},
+        },
+    },
+}
+
+# Function to open the store a schema loads into
+def open_schema_store(schema_name):
+    schema = SCHEMAS[schema_name]
+    return open_store(schema["workbook"], list(schema["columns"]), index=schema["index"])
+
+# Function to coerce a batch to a schema. Returns (valid rows, rejected rows
+# with a Reason column); raises ValueError when a required column is absent.
+def coerce_batch(batch, schema, start_date=None):
+    if "Date" in schema["columns"] and "Date" not in batch and "Day" in batch and start_date is not None:
+        days = pd.to_numeric(batch["Day"], errors="coerce")
+        batch = batch.assign(Date=pd.Timestamp(start_date) + pd.to_timedelta(days, unit="D"))
+    reasons = pd.Series("", index=batch.index, dtype=object)
+    out = {}
+    for column, rule in schema["columns"].items():
+        if column not in batch:
+            if "default" in rule:
+                out[column] = rule["default"]
+            elif not rule.get("optional"):
+                raise ValueError(f"Missing column {column}")
+            continue
+        values, bad = coerce_column(batch[column], rule)
+        missing = values.isna()
+        if "default" in rule:
+            values = values.where(~missing, rule["default"])
+        elif not rule.get("optional"):
+            bad = bad | missing
+        reasons = reasons.where((reasons != "") | ~bad, f"bad {column}")
+        out[column] = values
+    valid = (reasons == "").to_numpy()
+    clean = pd.DataFrame(out, index=batch.index)[valid].reset_index(drop=True)
+    for column, rule in schema["columns"].items():
+        if rule["type"] == "int" and column in clean and not clean[column].isna().any():
+            clean[column] = clean[column].astype(np.int64)
+    rejected = batch[~valid].assign(Reason=reasons[~valid])
+    return clean, rejected
+
+# Function to coerce one column; returns (values with NaN where missing,
+# mask of values that were present but invalid)
+def coerce_column(values, rule):
+    present = values.notna()
+    kind = rule["type"]
+    if kind in ("int", "float"):
+        coerced = pd.to_numeric(values, errors="coerce")
+        bad = present & coerced.isna()
+        if kind == "int":
+            bad |= coerced.notna() & (coerced != coerced.round())
+        if "min" in rule:
+            bad |= coerced < rule["min"]
+        if "max" in rule:
+            bad |= coerced > rule["max"]
+        return coerced.where(~bad), bad
+    if kind == "date":
+        coerced = pd.to_datetime(values, errors="coerce", format="ISO8601")
+        bad = present & coerced.isna()
+        return coerced.dt.strftime("%Y-%m-%d").where(coerced.notna()), bad
+    coerced = values.astype(str).str.strip().where(present)
+    coerced = coerced.where(coerced != "")
+    return coerced, pd.Series(False, index=values.index)
+
+# Function to name a source: its path, or the file name of an upload
+def source_name(source):
+    return source if isinstance(source, str) else getattr(source, "name", "upload")
+
+# Function to identify a source's contents for its checkpoint: path, size and
+# mtime for a file on disk, a hash of the bytes for an upload
+def source_id(source):
+    if isinstance(source, str):
+        stat = os.stat(source)
+        key = f"{os.path.abspath(source)}:{stat.st_size}:{stat.st_mtime_ns}"
+    else:
+        digest = hashlib.sha256()
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+        source.seek(0)
+        key = f"{source_name(source)}:{digest.hexdigest()}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+# Function to read a CSV or Parquet source batch_rows rows at a time,
+# skipping the first `skip` rows
+def read_batches(source, batch_rows, skip=0):
+    if source_name(source).lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        seen = 0
+        for record_batch in pq.ParquetFile(source).iter_batches(batch_size=batch_rows):
+            if seen + record_batch.num_rows > skip:
+                yield record_batch.slice(max(skip - seen, 0)).to_pandas()
+            seen += record_batch.num_rows
+    else:
+        skip_rows = (lambda i: 0 < i <= skip) if skip else None
+        yield from pd.read_csv(source, chunksize=batch_rows, skiprows=skip_rows)
+
+# Function to expand directories (e.g. write_partitions output) into their files
+def expand_sources(paths):
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            sources += sorted(os.path.join(path, name) for name in os.listdir(path)
+                              if name.lower().endswith((".csv", ".parquet")))
+        else:
+            sources.append(path)
+    return sources
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_checkpoint(path, checkpoint):
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+# Function to import one source into a store, resuming from its checkpoint.
+# progress(stats) is called after every batch. Returns the stats: rows read,
+# loaded and rejected, seconds, rows per second, and whether the source had
+# already been imported.
+def ingest(source, store, schema_name, batch_rows=BATCH_ROWS, restart=False, rejects=None,
+           start_date=None, progress=None, checkpoint_dir=INGEST_DIR):
+    schema = SCHEMAS[schema_name]
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpoint_path = os.path.join(checkpoint_dir, f"{schema_name}-{store_id(store)}-{source_id(source)}.json")
+    checkpoint = None if restart else load_checkpoint(checkpoint_path)
+    if checkpoint is None:
+        checkpoint = {"source": source_name(source), "read": 0, "loaded": 0, "rejected": 0, "done": False, "pending": None}
+    stats = {"read": 0, "loaded": 0, "rejected": 0, "seconds": 0.0, "rows_per_s": 0.0, "skipped": checkpoint["done"]}
+    if checkpoint["done"]:
+        return stats
+
+    # A batch whose append was interrupted counts as loaded if the store grew by it
+    pending = checkpoint["pending"]
+    if pending and store.count() >= pending["store_rows"] + pending["loaded"]:
+        for key in ("read", "loaded", "rejected"):
+            checkpoint[key] += pending[key]
+    checkpoint["pending"] = None
+
+    start = time.perf_counter()
+    for batch in read_batches(source, batch_rows, skip=checkpoint["read"]):
+        clean, rejected = coerce_batch(batch, schema, start_date)
+        checkpoint["pending"] = {"read": len(batch), "loaded": len(clean), "rejected": len(rejected), "store_rows": store.count()}
+        save_checkpoint(checkpoint_path, checkpoint)
+        if len(clean):
+            store.append(clean)
+        if rejects and len(rejected):
+            rejected.to_csv(rejects, mode="a", index=False, header=not os.path.exists(rejects))
+        for key in ("read", "loaded", "rejected"):
+            checkpoint[key] += checkpoint["pending"][key]
+            stats[key] += checkpoint["pending"][key]
+        checkpoint["pending"] = None
+        save_checkpoint(checkpoint_path, checkpoint)
+        stats["seconds"] = time.perf_counter() - start
+        stats["rows_per_s"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+        if progress:
+            progress(stats)
+    checkpoint["done"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    return stats
+
+# Function to describe an import's stats in one line
+def describe(stats):
+    if stats["skipped"]:
+        return "Already imported; restart the import to load it again"
+    return (f"{stats['loaded']:,} rows loaded, {stats['rejected']:,} rejected in {stats['seconds']:.1f}s "
+            f"({stats['rows_per_s']:,.0f} rows/s)")
+
+# Function to show the bulk import widget on a Data Entry page: a CSV or
+# Parquet upload imported into the page's store
+def upload_widget(store, schema_name, cache=None):
+    import streamlit as st
+    with st.expander("Bulk import (CSV or Parquet)"):
+        columns = ", ".join(SCHEMAS[schema_name]["columns"])
+        upload = st.file_uploader(f"File with columns {columns}", type=["csv", "parquet"], key=f"{schema_name}_upload")
+        restart = st.checkbox("Import again even if this file was imported before", key=f"{schema_name}_restart")
+        if upload is not None and st.button("Import", key=f"{schema_name}_import"):
+            bar = st.progress(0.0)
+            size = max(getattr(upload, "size", 0), 1)
+            try:
+                stats = ingest(upload, store, schema_name, restart=restart,
+                               progress=lambda stats: bar.progress(min(upload.tell() / size, 1.0), text=describe(stats)))
+            except ValueError as e:
+                st.error(f"Could not import {upload.name}: {e}")
+                return
+            finally:
+                if cache is not None:
+                    cache.invalidate(store)
+            bar.progress(1.0)
+            (st.info if stats["skipped"] else st.success)(describe(stats))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import bills or meter readings from CSV or Parquet files.")
+    parser.add_argument("schema", choices=sorted(SCHEMAS))
+    parser.add_argument("sources", nargs="+", help="CSV or Parquet files, or directories of them")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--restart", action="store_true", help="import files again even if already imported")
+    parser.add_argument("--rejects", default=None, help="CSV file to append rejected rows to")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=None,
+                        help="date of Day 0, for simulator output in the compact form")
+    args = parser.parse_args()
+
+    store = open_schema_store(args.schema)
+    total = {"loaded": 0, "rejected": 0, "seconds": 0.0}
+    for source in expand_sources(args.sources):
+        report = lambda stats: print(f"  {source}: {describe(stats)}", end="\r", flush=True)
+        stats = ingest(source, store, args.schema, args.batch_rows, args.restart, args.rejects, args.start_date, report)
+        print(f"  {source}: {describe(stats)}")
+        for key in total:
+            total[key] += stats[key]
+    rate = (total["loaded"] + total["rejected"]) / total["seconds"] if total["seconds"] else 0.0
+    print(f"{total['loaded']:,} rows loaded, {total['rejected']:,} rejected in {total['seconds']:.1f}s "
+          f"({rate:,.0f} rows/s); {store.count():,} rows in store")
@@ -0,0 +1,336 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import smtplib
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import date
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+import metrics
+
+# Email alert settings shared by the apps and monitor_service.py. Set the
+# SEMS_SMTP_* environment variables to use another account or server, e.g.
+# the local stand-in started with `python mailer.py serve`.
+SMTP_HOST = os.environ.get("SEMS_SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SEMS_SMTP_PORT", "587"))
+SENDER_EMAIL = os.environ.get("SEMS_SMTP_USER", "v647414@gmail.com")  # Replace with your email
+SENDER_PASSWORD = os.environ.get("SEMS_SMTP_PASSWORD", "kmmz ktrc tgnt ovvf")  # Replace with your App Password
+SMTP_PLAINTEXT = os.environ.get("SEMS_SMTP_PLAINTEXT", "0") == "1"  # 1: allow a server without TLS (the local stand-in); never logs in
+ALERT_LOG = os.environ.get("SEMS_ALERT_LOG", "alert_log.json")  # alerts already sent today
+
+log = logging.getLogger("mailer")
+
+# Function to build one alert email
+def build_message(subject, body, receiver_email):
+    msg = MIMEMultipart()
+    msg['From'] = SENDER_EMAIL
+    msg['To'] = receiver_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+# Function to open an SMTP connection, upgraded to TLS before logging in. A
+# server without STARTTLS is refused unless SMTP_PLAINTEXT is set, and even
+# then the credentials are not sent over it.
+def connect(host=None, port=None):
+    server = smtplib.SMTP(host or SMTP_HOST, port or SMTP_PORT, timeout=30)
+    try:
+        server.ehlo()
+        if server.has_extn("starttls"):
+            server.starttls()
+            server.ehlo()
+            if server.has_extn("auth"):
+                server.login(SENDER_EMAIL, SENDER_PASSWORD)
+        elif not SMTP_PLAINTEXT:
+            raise smtplib.SMTPNotSupportedError(
+                f"{host or SMTP_HOST}:{port or SMTP_PORT} does not offer STARTTLS; refusing to send the login in plaintext "
+                "(set SEMS_SMTP_PLAINTEXT=1 for the local stand-in)")
+    except BaseException:
+        server.close()
+        raise
+    return server
+
+# Function to send an email
+def send_email(subject, body, receiver_email):
+    message = build_message(subject, body, receiver_email).as_string()
+    with metrics.timed("smtp_send", path="direct") as span, connect() as server:
+        server.sendmail(SENDER_EMAIL, receiver_email, message)
+        span.record(rows=1, nbytes=len(message))
+
+# Function to fail early when alerts cannot be sent: the sender must be
+# configured and the server must accept the login
+def check_credentials():
+    if not SENDER_EMAIL or not SENDER_PASSWORD:
+        raise RuntimeError("Email alerts need SEMS_SMTP_USER and SEMS_SMTP_PASSWORD")
+    with connect():
+        pass
+
+# Function to build the de-duplication key for an appliance's alert today
+def alert_key(item, receiver_email, day=None):
+    return (item, receiver_email, (day or date.today()).isoformat())
+
+# ---- OUTBOX ----
+# Queued alert delivery. submit() only enqueues, so callers never wait on
+# SMTP. A few worker threads each keep one authenticated connection open and
+# send whatever is queued in batches over it; a failed send reconnects and
+# retries with exponential backoff. Each alert carries a key such as
+# (appliance, email, day): a key that was already sent (or is still queued)
+# is suppressed, so an appliance that stays over its limit is mailed once a
+# day instead of on every cycle. Sent keys for today are kept in ALERT_LOG
+# so a restart does not mail them again.
+class Outbox:
+    def __init__(self, connections=2, batch_size=50, max_retries=4, backoff=0.5,
+                 idle_timeout=60, log_path=ALERT_LOG, connect=connect):
+        self.connect = connect
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.log_path = log_path
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.delivered = self._load_keys()  # keys sent today
+        self.keys = set(self.delivered)  # keys sent or still queued
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.suppressed = 0
+        self.connections_opened = 0
+        self.send_seconds = 0.0
+        self.stopping = False
+        self.workers = [threading.Thread(target=self._work, name=f"outbox-{i}", daemon=True)
+                        for i in range(connections)]
+        for worker in self.workers:
+            worker.start()
+
+    def _load_keys(self):
+        if not self.log_path:
+            return set()
+        try:
+            with open(self.log_path) as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return set()
+        if saved.get("day") != date.today().isoformat():
+            return set()
+        return {tuple(key) for key in saved["keys"]}
+
+    def _save_keys(self):
+        if not self.log_path:
+            return
+        today = date.today().isoformat()
+        self.delivered = {key for key in self.delivered if key[-1] == today}
+        keys = [list(key) for key in self.delivered]
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.log_path)), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"day": today, "keys": keys}, f)
+        os.replace(tmp_path, self.log_path)
+
+    # Queue one email; returns False when an alert with this key already went
+    # out today. Keys are tuples ending with the ISO date, see alert_key().
+    def submit(self, subject, body, receiver_email, key=None):
+        with self.lock:
+            if key is not None:
+                if key in self.keys:
+                    self.suppressed += 1
+                    return False
+                self.keys.add(key)
+        self.queue.put((subject, body, receiver_email, key))
+        return True
+
+    def _work(self):
+        server = None
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.idle_timeout)]
+            except queue.Empty:
+                server = self._close(server)  # do not hold idle connections
+                continue
+            if batch[0] is None:
+                self.queue.task_done()
+                self._close(server)
+                return
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.queue.put(item)  # leave the stop marker for the next loop
+                    self.queue.task_done()
+                    break
+                batch.append(item)
+            start = time.perf_counter()
+            for item in batch:
+                server = self._deliver(server, *item)
+            with self.lock:
+                self.send_seconds += time.perf_counter() - start
+                if any(item[3] is not None for item in batch):
+                    self._save_keys()
+            for item in batch:
+                self.queue.task_done()
+
+    # Send one email over the worker's connection, reconnecting and backing off
+    # on failure; returns the connection to keep using
+    def _deliver(self, server, subject, body, receiver_email, key):
+        message = build_message(subject, body, receiver_email).as_string()
+        for attempt in range(self.max_retries + 1):
+            try:
+                if server is None:
+                    with metrics.timed("smtp_connect"):
+                        server = self.connect()
+                    with self.lock:
+                        self.connections_opened += 1
+                with metrics.timed("smtp_send", path="outbox") as span:
+                    server.sendmail(SENDER_EMAIL, receiver_email, message)
+                    span.record(rows=1, nbytes=len(message))
+            except (smtplib.SMTPException, OSError) as e:
+                server = self._close(server)
+                if attempt == self.max_retries:
+                    log.error("Giving up on alert to %s after %d attempts: %s", receiver_email, attempt + 1, e)
+                    with self.lock:
+                        self.failed += 1
+                        self.keys.discard(key)  # let a later cycle try again
+                    return server
+                with self.lock:
+                    self.retries += 1
+                time.sleep(self.backoff * 2 ** attempt)
+            else:
+                with self.lock:
+                    self.sent += 1
+                    if key is not None:
+                        self.delivered.add(key)
+                return server
+
+    def _close(self, server):
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+        return None
+
+    # Wait until everything queued so far has been sent or given up on
+    def flush(self):
+        self.queue.join()
+
+    # Send what is queued, then close every connection
+    def close(self):
+        if self.stopping:
+            return
+        self.stopping = True
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "sent": self.sent,
+                "failed": self.failed,
+                "retries": self.retries,
+                "suppressed": self.suppressed,
+                "queue_depth": self.queue.qsize(),
+                "connections_opened": self.connections_opened,
+                "emails_per_second": self.sent / self.send_seconds if self.send_seconds else 0.0,
+            }
+
+# ---- LOCAL SMTP STAND-IN ----
+# A minimal SMTP server for development, tests and benchmarks: it accepts
+# every message without TLS or login (connect() needs SMTP_PLAINTEXT for it)
+# and keeps it in memory. fail_next makes
+# the next N transactions fail with a temporary error, to exercise retries.
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost SMTP stand-in ready")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                with server.lock:
+                    failing = server.fail_next > 0
+                    server.fail_next -= failing
+                if failing:
+                    self.reply("451 Temporary failure, try again")
+                else:
+                    sender, recipients = command[10:].strip("<> "), []
+                    self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command[8:].strip("<> "))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data)
+                with server.lock:
+                    server.messages.append((sender, recipients, b"".join(lines)))
+                self.reply("250 OK: queued")
+            elif verb in ("RSET", "NOOP"):
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.fail_next = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    # Serve on a background thread; returns the server
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="smtp-stand-in", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Email alert tools.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    serve = subcommands.add_parser("serve", help="run the local SMTP stand-in")
+    serve.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    server = LocalSMTPServer(port=args.port)
+    print(f"SMTP stand-in on 127.0.0.1:{server.port}; run the apps with SEMS_SMTP_HOST=127.0.0.1 SEMS_SMTP_PORT={server.port} SEMS_SMTP_PLAINTEXT=1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{len(server.messages)} messages received")
@@ -0,0 +1,262 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Timing of the apps' hot paths: store reads and writes (pd.read_excel /
+# to_excel on the Excel backend), the Reports groupbys, model fits, SMTP
+# sends and monitoring cycles. Each operation keeps a latency histogram and
+# totals of calls, rows and bytes, per set of labels:
+#
+#   with metrics.timed("store_read", backend="sqlite", table="monthly_bills") as span:
+#       df = ...
+#       if span:
+#           span.record(rows=len(df), nbytes=frame_bytes(df))
+#
+# Set SEMS_METRICS=1 to turn it on. The pages then show a Diagnostics panel in
+# the sidebar, and every process writes its numbers in the Prometheus text
+# format to SEMS_METRICS_DIR/<job>.prom (point node_exporter's textfile
+# collector at the directory), or serves them at
+# http://host:SEMS_METRICS_PORT/metrics when a port is set.
+#
+# Off, timed() hands back one shared do-nothing span: a call costs a flag
+# test and an empty with block, and the span is falsy so callers can skip
+# counting rows and bytes too.
+
+METRICS_ENABLED = os.environ.get("SEMS_METRICS", "") not in ("", "0")
+METRICS_DIR = os.environ.get("SEMS_METRICS_DIR", "metrics")
+METRICS_PORT = int(os.environ.get("SEMS_METRICS_PORT", "0"))  # 0: no endpoint
+EXPORT_EVERY_S = 1.0  # at most one file write per second per process
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+
+# One operation's numbers for one set of labels
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+
+    def observe(self, seconds, rows, nbytes):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.seconds += seconds
+        self.rows += rows
+        self.bytes += nbytes
+
+    # Function to estimate a quantile from the buckets (their upper bound)
+    def quantile(self, q):
+        seen = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.buckets):
+            seen += count
+            if seen >= q * self.count:
+                return bound
+        return float("inf")
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (operation, sorted label items) -> Histogram
+        self.exported_at = 0.0
+
+    def observe(self, operation, labels, seconds, rows=0, nbytes=0):
+        key = (operation, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds, rows, nbytes)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+    # Function to list one row per operation and labels, for display
+    def summary(self):
+        with self.lock:
+            items = sorted(self.histograms.items())
+            return [{
+                "Operation": operation,
+                "Labels": ", ".join(f"{k}={v}" for k, v in labels),
+                "Calls": h.count,
+                "Mean ms": round(1000 * h.seconds / h.count, 2),
+                "p50 ms": 1000 * h.quantile(0.5),
+                "p95 ms": 1000 * h.quantile(0.95),
+                "Rows": h.rows,
+                "Bytes": h.bytes,
+            } for (operation, labels), h in items]
+
+    # Function to render everything in the Prometheus text exposition format
+    def prometheus(self, job=None):
+        lines = [
+            "# HELP sems_operation_seconds Latency of instrumented operations.",
+            "# TYPE sems_operation_seconds histogram",
+        ]
+        totals = []
+        with self.lock:
+            for (operation, labels), h in sorted(self.histograms.items()):
+                base = [("op", operation)] + ([("job", job)] if job else []) + list(labels)
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float("inf"),), h.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"sems_operation_seconds_bucket{_labels(base + [('le', le)])} {cumulative}")
+                lines.append(f"sems_operation_seconds_sum{_labels(base)} {h.seconds!r}")
+                lines.append(f"sems_operation_seconds_count{_labels(base)} {h.count}")
+                totals.append((base, h.rows, h.bytes))
+        lines += ["# HELP sems_operation_rows_total Rows read or written by instrumented operations.",
+                  "# TYPE sems_operation_rows_total counter"]
+        lines += [f"sems_operation_rows_total{_labels(base)} {rows}" for base, rows, _ in totals]
+        lines += ["# HELP sems_operation_bytes_total Bytes read or written by instrumented operations.",
+                  "# TYPE sems_operation_bytes_total counter"]
+        lines += [f"sems_operation_bytes_total{_labels(base)} {nbytes}" for base, _, nbytes in totals]
+        return "\n".join(lines) + "\n"
+
+def _labels(items):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+registry = Registry()
+
+# An operation being timed; record() adds its row and byte counts
+class Span:
+    __slots__ = ("rows", "nbytes")
+
+    def __init__(self):
+        self.rows = 0
+        self.nbytes = 0
+
+    def record(self, rows=0, nbytes=0):
+        self.rows += rows
+        self.nbytes += nbytes
+
+# Stand-in handed out while metrics are off; falsy, and records nothing
+class _NullSpan:
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def record(self, rows=0, nbytes=0):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+@contextmanager
+def _timed(operation, labels):
+    span = Span()
+    start = time.perf_counter()
+    try:
+        yield span
+    finally:
+        registry.observe(operation, labels, time.perf_counter() - start, span.rows, span.nbytes)
+
+# Function to time a block as one call of an operation (see the top of the file)
+def timed(operation, **labels):
+    if not METRICS_ENABLED:
+        return NULL_SPAN
+    return _timed(operation, labels)
+
+# Decorator timing every call of a function as an operation. labels(*args,
+# **kwargs) names the call; rows and nbytes count what it read or wrote, given
+# (result, *args, **kwargs). The flag is checked per call, so enable() works
+# on functions decorated earlier.
+def instrumented(operation, labels=None, rows=None, nbytes=None):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return fn(*args, **kwargs)
+            with _timed(operation, labels(*args, **kwargs) if labels else {}) as span:
+                result = fn(*args, **kwargs)
+                span.record(rows(result, *args, **kwargs) if rows else 0,
+                            nbytes(result, *args, **kwargs) if nbytes else 0)
+            return result
+        return call
+    return decorate
+
+# Function to turn metrics on or off in this process (bench.py, tests)
+def enable(enabled=True):
+    global METRICS_ENABLED
+    METRICS_ENABLED = enabled
+
+# Function to estimate a frame's size in bytes without walking its strings
+def frame_bytes(df):
+    return int(df.memory_usage(index=False, deep=False).sum())
+
+# Function to write this process's metrics to METRICS_DIR/<job>.prom, at most
+# once per EXPORT_EVERY_S unless forced
+def export(job, force=False):
+    if not METRICS_ENABLED:
+        return None
+    now = time.monotonic()
+    if not force and now - registry.exported_at < EXPORT_EVERY_S:
+        return None
+    registry.exported_at = now
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{job}.prom")
+    with open(path + ".tmp", "w") as f:
+        f.write(registry.prometheus(job))
+    os.replace(path + ".tmp", path)
+    return path
+
+_server = None
+_server_lock = threading.Lock()
+
+# Function to serve /metrics on METRICS_PORT from a background thread, once
+# per process (Streamlit reruns the page script, so this is called often)
+def serve(job, port=None):
+    global _server
+    port = port or METRICS_PORT
+    if not METRICS_ENABLED or not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = registry.prometheus(job).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            _server = ThreadingHTTPServer(("", port), Handler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
+
+# Function to show the Diagnostics panel in a page's sidebar and publish the
+# metrics; called at the end of each page run, does nothing while disabled
+def diagnostics_sidebar(job):
+    if not METRICS_ENABLED:
+        return
+    import streamlit as st
+    serve(job)
+    export(job)
+    with st.sidebar.expander("Diagnostics"):
+        rows = registry.summary()
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        else:
+            st.caption("Nothing timed yet.")
+        st.caption(f"Written to {os.path.join(METRICS_DIR, job + '.prom')}"
+                   + (f"; served on :{METRICS_PORT}/metrics" if METRICS_PORT else ""))
+        if st.button("Reset timings", key="metrics_reset"):
+            registry.reset()
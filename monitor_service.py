@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+
+import pandas as pd
+
+import mailer
+import metrics
+import readings
+from storage import open_store
+from datacache import data_cache
+from monitoring import (run_monitoring_cycle, evaluate_appliances, crossing_times, alert_message,
+                        write_monitor_state, with_live_columns, LimitScheduler, MONITOR_STATE_FILE)
+
+# Standalone appliance monitoring service; the Streamlit pages only read the
+# monitor state file it publishes, however many tabs are open. Alerts are
+# event driven: each appliance's limit crossing time is computed when it is
+# saved or edited (the store is checked every --watch seconds) and kept in a
+# heap, and the service sleeps until the next crossing is due, so an alert
+# goes out within moments of the crossing and idle appliances cost nothing.
+# Alert emails are queued on a pooled outbox (see mailer.Outbox). Every
+# --interval seconds the totals of all appliances are refreshed, saved and
+# published. Run it next to the apps:
+#
+#   python monitor_service.py --interval 1800
+#
+# With --readings-port it also accepts live meter readings (see readings.py).
+# Appliances that send them are judged on what they measured: their window
+# figures and today's Total Volts are checked against the limit and published
+# every --watch seconds while readings arrive, instead of being scheduled.
+#
+# SIGINT/SIGTERM stop it cleanly after the current cycle.
+
+EXCEL_APPLIANCE_DATA = "appliance_data.xlsx"
+log = logging.getLogger("monitor_service")
+
+class MonitorService:
+    # outbox is a mailer.Outbox; without one alerts are only logged
+    # windows is a readings.ReadingWindows fed by a ReadingServer, or None
+    def __init__(self, store, interval=1800, state_path=MONITOR_STATE_FILE, outbox=None, watch=5, windows=None):
+        self.store = store
+        self.interval = interval
+        self.state_path = state_path
+        self.outbox = outbox
+        self.watch = watch
+        self.cycle = 0
+        self.stopping = asyncio.Event()
+        self.scheduler = LimitScheduler()
+        self.signature = None
+        self.appliance_data_df = None
+        self.started = pd.Timestamp.now()
+        self.alerts_fired = 0
+        self.max_latency = 0.0
+        self.windows = windows
+        self.live = None  # the windows' latest snapshot
+        self.live_received = 0  # windows.received at that snapshot
+        self.live_alerted = set()  # alert keys of live appliances already over today
+
+    def stop(self):
+        self.stopping.set()
+
+    # Function to reschedule the appliances saved or edited since the last check
+    async def sync_schedule(self, now):
+        signature = await asyncio.to_thread(self.store.signature)
+        if signature == self.signature and self.scheduler.day == now.normalize():
+            return
+        self.signature = signature
+        self.appliance_data_df = await asyncio.to_thread(data_cache.read, self.store)
+        changed = self.scheduler.sync(self.appliance_data_df, now)
+        if changed:
+            log.info("Rescheduled %d appliances; %d crossings pending today", changed, self.scheduler.pending())
+
+    # Function to alert every appliance whose crossing is due. The outbox mails
+    # each over-limit appliance at most once a day.
+    async def fire_due(self, now):
+        due = self.scheduler.pop_due(now)
+        if not due:
+            return 0
+        rows = self.appliance_data_df.loc[[row_id for row_id, _ in due]]
+        if self.live is not None:
+            # Metered appliances are checked on their readings (check_live)
+            metered = rows["Item"].isin(self.live.index)
+            due = [(row_id, when) for row_id, when in due if not metered[row_id]]
+            rows = rows[~metered]
+            if not due:
+                return 0
+        total_volts, over_limit = evaluate_appliances(rows, now)
+        fired = 0
+        for row_id, when in due:
+            if not over_limit[row_id]:
+                # Rounding left Total Volts on the limit: retry one 0.01 kV step later
+                self.scheduler.push(row_id, now + pd.Timedelta(hours=0.01 / float(rows.loc[row_id, "Kilovolts (kV)"])))
+                continue
+            item, max_limit, email = rows.loc[row_id, ["Item", "Max Limit (kV)", "Email"]]
+            self.send_alert(item, total_volts[row_id], max_limit, email)
+            self.max_latency = max(self.max_latency, (now - max(when, self.started)).total_seconds())
+            fired += 1
+        self.alerts_fired += fired
+        if fired:
+            log.info("%d appliances crossed their limit", fired)
+            await self.publish(now, persist=False)
+        return fired
+
+    def send_alert(self, item, total_volts, max_limit, email):
+        subject, body = alert_message(item, total_volts, max_limit)
+        if self.outbox is None:
+            log.info("Not emailing %s: %s", email, subject)
+        else:
+            self.outbox.submit(subject, body, email, key=mailer.alert_key(item, email))
+
+    # Function to check the metered appliances against their limits on the
+    # readings received since the last check, alerting each once a day, and
+    # publish their live figures
+    async def check_live(self, now):
+        if self.windows is None or self.appliance_data_df is None or self.windows.received == self.live_received:
+            return 0
+        self.live_received = self.windows.received
+        self.live = self.windows.snapshot()
+        today = now.date().isoformat()
+        self.live_alerted = {key for key in self.live_alerted if key[-1] == today}
+        rows = self.appliance_data_df[self.appliance_data_df["Item"].isin(self.live.index)]
+        total_volts, over_limit = evaluate_appliances(rows, now, self.live)
+        fired = 0
+        for row_id in rows.index[over_limit.to_numpy()]:
+            item, max_limit, email = rows.loc[row_id, ["Item", "Max Limit (kV)", "Email"]]
+            key = mailer.alert_key(item, email, now.date())
+            if key in self.live_alerted:
+                continue
+            self.live_alerted.add(key)
+            self.send_alert(item, total_volts[row_id], max_limit, email)
+            fired += 1
+        self.alerts_fired += fired
+        if fired:
+            log.info("%d metered appliances crossed their limit", fired)
+        await self.publish(now, persist=False)
+        return fired
+
+    def scheduler_stats(self):
+        next_due = self.scheduler.next_due()
+        return {
+            "pending": self.scheduler.pending(),
+            "next_crossing": next_due.isoformat(timespec="seconds") if next_due is not None else None,
+            "alerts_fired": self.alerts_fired,
+            "max_latency_s": round(self.max_latency, 3),
+        }
+
+    # Function to publish the state. With persist, Total Volts of every
+    # appliance is also saved to the store (one batched write).
+    async def publish(self, now, persist=True):
+        if persist:
+            self.cycle += 1
+            appliance_data_df, over_limit = await asyncio.to_thread(run_monitoring_cycle, self.store, data_cache, now, self.live)
+        else:
+            appliance_data_df = self.appliance_data_df.copy()
+            appliance_data_df["Total Volts"], over_limit = evaluate_appliances(appliance_data_df, now, self.live)
+        if len(appliance_data_df):
+            appliance_data_df["Limit Crossing"] = crossing_times(appliance_data_df, now).dt.strftime("%H:%M:%S")
+            appliance_data_df = with_live_columns(appliance_data_df, self.live)
+        outbox_stats = self.outbox.stats() if self.outbox else None
+        readings_stats = self.windows.stats() if self.windows else None
+        await asyncio.to_thread(write_monitor_state, appliance_data_df, over_limit, self.cycle, self.interval,
+                                self.state_path, outbox_stats, self.scheduler_stats(), readings_stats)
+        if persist:
+            log.info("Cycle %d: %d appliances, %d over limit", self.cycle, len(appliance_data_df), int(over_limit.sum()))
+            if outbox_stats:
+                log.info("Outbox: %s", outbox_stats)
+            metrics.export("monitor_service", force=True)
+
+    # Function to run until stop() is called (or `cycles` refreshes are done):
+    # sleep until the next crossing, store check or refresh, whichever is first
+    async def run(self, cycles=None):
+        next_refresh = pd.Timestamp.now()
+        while not self.stopping.is_set():
+            now = pd.Timestamp.now()
+            try:
+                await self.sync_schedule(now)
+                await self.fire_due(now)
+                await self.check_live(now)
+                if now >= next_refresh:
+                    next_refresh = now + pd.Timedelta(seconds=self.interval)
+                    await self.publish(now)
+                    if cycles is not None and self.cycle >= cycles:
+                        break
+            except Exception:
+                log.exception("Monitoring cycle failed")
+            wake = min(next_refresh, now + pd.Timedelta(seconds=self.watch), now.normalize() + pd.Timedelta(days=1))
+            next_due = self.scheduler.next_due()
+            if next_due is not None:
+                wake = min(wake, next_due)
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=max((wake - pd.Timestamp.now()).total_seconds(), 0))
+            except asyncio.TimeoutError:
+                pass
+        if self.outbox is not None:
+            await asyncio.to_thread(self.outbox.close)  # deliver what is still queued
+        log.info("Monitoring service stopped after %d cycles", self.cycle)
+
+async def main(args):
+    outbox = None
+    if not args.no_email:
+        try:
+            await asyncio.to_thread(mailer.check_credentials)
+        except Exception as e:
+            sys.exit(f"Cannot send email alerts ({e}); fix the SEMS_SMTP_* settings or pass --no-email")
+        outbox = mailer.Outbox(connections=args.smtp_connections)
+    store = open_store(args.workbook, ["Item", "Kilovolts (kV)", "Start Time", "Max Limit (kV)", "Total Volts", "Email"])
+    windows = server = None
+    if args.readings_port:
+        windows = readings.ReadingWindows(args.window)
+        server = readings.ReadingServer(windows, args.readings_host, args.readings_port)
+        log.info("Accepting live readings on %s:%d", args.readings_host, await server.start())
+    service = MonitorService(store, args.interval, args.state, outbox, args.watch, windows)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, service.stop)
+        except NotImplementedError:  # Windows event loops
+            pass
+    await service.run(cycles=1 if args.once else args.cycles)
+    if server is not None:
+        await server.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the appliance monitoring and alerting service.")
+    parser.add_argument("--interval", type=float, default=1800, help="seconds between refreshes of every appliance's totals")
+    parser.add_argument("--watch", type=float, default=5, help="seconds between checks for saved or edited appliances")
+    parser.add_argument("--cycles", type=int, default=None, help="stop after this many cycles (default: run until stopped)")
+    parser.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    parser.add_argument("--workbook", default=EXCEL_APPLIANCE_DATA, help="appliance workbook / store name")
+    parser.add_argument("--no-email", action="store_true", help="log alerts instead of emailing them")
+    parser.add_argument("--smtp-connections", type=int, default=2, help="SMTP connections kept open for alerts")
+    parser.add_argument("--state", default=MONITOR_STATE_FILE, help="where to publish the latest state")
+    parser.add_argument("--readings-port", type=int, default=readings.READINGS_PORT, help="accept live meter readings on this port (see readings.py; 0: off)")
+    parser.add_argument("--readings-host", default="127.0.0.1", help="address to accept live readings on")
+    parser.add_argument("--window", type=float, default=readings.WINDOW_S, help="seconds in the live readings' sliding window")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(main(args))
@@ -0,0 +1,196 @@
+import heapq
+import itertools
+import json
+import os
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# Appliance voltage monitoring shared by the apps. A cycle evaluates every
+# appliance in one vectorized pass over the frame:
+#   Total Volts = round(kV * hours since today's Start Time, 2), floored at 0
+# and writes all the new totals back to the store in a single batch.
+# monitor_service.py runs cycles on a schedule, fires alerts at the crossing
+# times kept by LimitScheduler, and publishes the latest result to
+# MONITOR_STATE_FILE, which the Streamlit pages only read.
+# Appliances with a live meter (see readings.py) take Total Volts from their
+# readings instead: the kV·h measured since midnight, passed in as `live`.
+MONITOR_STATE_FILE = os.environ.get("SEMS_MONITOR_STATE", "monitor_state.json")
+LIVE_COLUMNS = ["Live kV", "Peak kV", "Mean kV", "Window kV·h", "Readings/s", "Last Reading"]  # as in readings.py
+STATE_COLUMNS = ["Item", "Kilovolts (kV)", "Start Time", "Max Limit (kV)", "Total Volts", "Email", "Limit Crossing"] + LIVE_COLUMNS
+
+# Function to parse the "HH:MM" Start Time column into offsets from midnight.
+# Values that came back from Excel as "HH:MM:SS" or time objects also parse.
+def parse_start_times(start_times):
+    text = start_times.astype(str).str.strip()
+    text = text.where(text.str.count(":") == 2, text + ":00")
+    return pd.to_timedelta(text)
+
+# Function to compute Total Volts for every appliance and the over-limit mask.
+# live is ReadingWindows.snapshot(): appliances in it use their measured total.
+@metrics.instrumented("monitoring_evaluate", rows=lambda result, appliance_data_df, *args, **kwargs: len(appliance_data_df))
+def evaluate_appliances(appliance_data_df, now=None, live=None):
+    now = pd.Timestamp(now or datetime.now())
+    start = now.normalize() + parse_start_times(appliance_data_df["Start Time"])
+    hours = ((now - start).dt.total_seconds() / 3600).clip(lower=0)  # Ensure non-negative
+    kilovolts = pd.to_numeric(appliance_data_df["Kilovolts (kV)"], errors="coerce")
+    total_volts = np.round(kilovolts * hours, 2)
+    if live is not None and len(live):
+        measured = appliance_data_df["Item"].map(live["Total Volts"])
+        total_volts = np.round(measured, 2).fillna(total_volts)
+    over_limit = total_volts > pd.to_numeric(appliance_data_df["Max Limit (kV)"], errors="coerce")
+    return total_volts, over_limit
+
+# Function to run one monitoring cycle: evaluate all appliances, persist
+# Total Volts once, and return the updated frame with its over-limit mask
+def run_monitoring_cycle(store, cache, now=None, live=None):
+    with metrics.timed("monitoring_cycle") as span:
+        appliance_data_df = cache.read(store)
+        if appliance_data_df.empty:
+            return appliance_data_df, pd.Series(False, index=appliance_data_df.index)
+        total_volts, over_limit = evaluate_appliances(appliance_data_df, now, live)
+        appliance_data_df["Total Volts"] = total_volts
+        cache.update_rows(store, appliance_data_df.index, {"Total Volts": total_volts.to_numpy()})
+        span.record(rows=len(appliance_data_df))
+    return appliance_data_df, over_limit
+
+# ---- LIMIT SCHEDULER ----
+# Total Volts grows linearly from an appliance's Start Time, so the moment it
+# passes Max Limit (kV) is known as soon as the appliance is saved:
+#   crossing = today's Start Time + (Max Limit + 0.005) / kV hours
+# (the 0.005 is where Total Volts, rounded to 2 decimals, first exceeds it).
+# Appliances that draw nothing, or cannot reach their limit before midnight
+# (when Total Volts starts again from zero), have no crossing today.
+def crossing_times(appliance_data_df, now=None):
+    now = pd.Timestamp(now or datetime.now())
+    midnight = now.normalize()
+    start = midnight + parse_start_times(appliance_data_df["Start Time"])
+    kilovolts = pd.to_numeric(appliance_data_df["Kilovolts (kV)"], errors="coerce")
+    max_limit = pd.to_numeric(appliance_data_df["Max Limit (kV)"], errors="coerce")
+    hours = ((max_limit + 0.005) / kilovolts.where(kilovolts > 0)).clip(lower=0)
+    crossing = start + pd.to_timedelta(hours, unit="h")
+    return crossing.where(crossing < midnight + pd.Timedelta(days=1))
+
+# Pending limit crossings in a heap keyed by time. Only appliances whose kV,
+# Start Time or Max Limit changed are recomputed on sync(); everything else
+# costs nothing until its crossing is due. Entries of rescheduled or removed
+# appliances stay in the heap and are skipped when they surface.
+class LimitScheduler:
+    INPUTS = ["Kilovolts (kV)", "Start Time", "Max Limit (kV)"]
+
+    def __init__(self):
+        self.heap = []  # (due, token, row id)
+        self.tokens = {}  # row id -> token of its live entry, for rows with a crossing
+        self.counter = itertools.count()
+        self.inputs = pd.DataFrame(columns=self.INPUTS, dtype=str)
+        self.day = None
+
+    # Function to (re)schedule the given rows; returns how many have a crossing today
+    def schedule(self, appliance_data_df, now=None):
+        due = crossing_times(appliance_data_df, now)
+        for row_id, when in due.items():
+            self.push(row_id, when)
+        return int(due.notna().sum())
+
+    def push(self, row_id, when):
+        if pd.isna(when):
+            self.tokens.pop(row_id, None)
+            return
+        token = next(self.counter)
+        self.tokens[row_id] = token
+        heapq.heappush(self.heap, (when, token, row_id))
+
+    # Function to bring the schedule in line with the current appliance table:
+    # new or edited rows are rescheduled, deleted rows dropped, and every row
+    # is rescheduled when the day has changed. Returns the rows rescheduled.
+    def sync(self, appliance_data_df, now=None):
+        now = pd.Timestamp(now or datetime.now())
+        inputs = appliance_data_df[self.INPUTS].astype(str)
+        if self.day != now.normalize():
+            self.day = now.normalize()
+            self.heap, self.tokens = [], {}
+            changed = inputs.index
+        else:
+            previous = self.inputs.reindex(inputs.index)
+            changed = inputs.index[(inputs != previous).any(axis=1)]
+            for row_id in self.inputs.index.difference(inputs.index):
+                self.tokens.pop(row_id, None)
+        self.inputs = inputs
+        self.schedule(appliance_data_df.loc[changed], now)
+        return len(changed)
+
+    def _drop_stale(self):
+        while self.heap and self.tokens.get(self.heap[0][2]) != self.heap[0][1]:
+            heapq.heappop(self.heap)
+
+    # Function to get the time of the next crossing, or None
+    def next_due(self):
+        self._drop_stale()
+        return self.heap[0][0] if self.heap else None
+
+    # Function to pop every crossing due at `now`; returns [(row id, due time)]
+    def pop_due(self, now=None):
+        now = pd.Timestamp(now or datetime.now())
+        due = []
+        while self.next_due() is not None and self.heap[0][0] <= now:
+            when, _, row_id = heapq.heappop(self.heap)
+            del self.tokens[row_id]
+            due.append((row_id, when))
+        return due
+
+    # Number of appliances still to cross their limit today
+    def pending(self):
+        return len(self.tokens)
+
+# Function to add the live window figures to an appliance frame, by Item
+def with_live_columns(appliance_data_df, live):
+    if live is None or not len(live):
+        return appliance_data_df
+    return appliance_data_df.join(live[LIVE_COLUMNS], on="Item")
+
+# Function to build the alert email for one over-limit appliance
+def alert_message(item, total_volts, max_limit):
+    subject = f"⚠️Voltage Limit Exceeded for {item}⚠️"
+    body = f"Warning! {item} exceeded its daily voltage limit.\nTotal Volts: {total_volts} kV\nLimit: {max_limit} kV\nPlease Turn Off Your {item}"
+    return subject, body
+
+# Function to publish the result of a cycle for the pages to read.
+# Each write goes to its own temporary file that then atomically replaces the
+# state, so readers never see a half-written file and writers never collide.
+def write_monitor_state(appliance_data_df, over_limit, cycle, interval, path=MONITOR_STATE_FILE, outbox=None, scheduler=None, readings=None):
+    columns = [c for c in STATE_COLUMNS if c in appliance_data_df]
+    rows = appliance_data_df[columns].assign(**{"Over Limit": over_limit.to_numpy()})
+    state = {
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+        "cycle": cycle,
+        "interval_seconds": interval,
+        "appliances": json.loads(rows.to_json(orient="records")),
+        "outbox": outbox,  # alert email stats, see mailer.Outbox.stats()
+        "scheduler": scheduler,  # limit crossing stats, see monitor_service.py
+        "readings": readings,  # live reading stats, see readings.ReadingWindows.stats()
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return state
+
+# Function to load the latest published state, or None if there is none yet
+def read_monitor_state(path=MONITOR_STATE_FILE):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    state["appliances"] = pd.DataFrame(state["appliances"], columns=STATE_COLUMNS + ["Over Limit"])
+    state["appliances"]["Over Limit"] = state["appliances"]["Over Limit"].astype(bool)
+    state["updated_at"] = datetime.fromisoformat(state["updated_at"])
+    return state
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+
+import numpy as np
+import sklearn
+from sklearn.linear_model import LinearRegression
+
+import metrics
+
+# Electricity Bill Prediction, shared by the pages and bench.py: a linear
+# trend of Amount against Month, extrapolated to the month after the last one.
+
+MODEL_CACHE_DIR = os.environ.get("SEMS_MODEL_CACHE", "model_cache")  # fitted models, one file each
+
+# Fitted models keyed by a fingerprint of the Month/Amount values they were
+# trained on (plus the scikit-learn version). A model is only refitted when
+# its slice of the bills changes; fitted models are pickled to MODEL_CACHE_DIR
+# so they survive app restarts. Shared by every Streamlit session.
+class ModelCache:
+    def __init__(self, path=MODEL_CACHE_DIR, max_entries=64):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.models = {}  # fingerprint -> fitted model
+        self.hits = 0
+        self.misses = 0
+
+    # Function to fingerprint the training slice
+    @staticmethod
+    def fingerprint(X, y):
+        digest = hashlib.sha256(sklearn.__version__.encode())
+        for values in (X, y):
+            values = np.ascontiguousarray(values, dtype=np.float64)
+            digest.update(str(values.shape).encode())
+            digest.update(values.tobytes())
+        return digest.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.pkl")
+
+    def _load(self, key):
+        if not self.path:
+            return None
+        try:
+            with open(self._file(key), "rb") as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+    def _save(self, key, model):
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(model, f)
+        os.replace(tmp_path, self._file(key))
+        # Keep the newest max_entries models on disk
+        saved = sorted((entry for entry in os.scandir(self.path) if entry.name.endswith(".pkl")),
+                       key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in saved[self.max_entries:]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    # Function to return (model fitted on X, y; whether it came from the cache)
+    def fit(self, X, y):
+        key = self.fingerprint(X, y)
+        with self.lock:
+            model = self.models.get(key)
+        if model is None:
+            model = self._load(key)
+        if model is not None:
+            with self.lock:
+                self.models[key] = model
+                self.hits += 1
+            return model, True
+        model = fit_model(X, y)
+        self._save(key, model)
+        with self.lock:
+            if len(self.models) >= self.max_entries:
+                self.models.pop(next(iter(self.models)))
+            self.models[key] = model
+            self.misses += 1
+        return model, False
+
+    # Function to drop every cached model, in memory and on disk
+    def clear(self):
+        with self.lock:
+            self.models.clear()
+        if self.path and os.path.isdir(self.path):
+            for entry in os.scandir(self.path):
+                if entry.name.endswith(".pkl"):
+                    os.remove(entry.path)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.models)}
+
+# Function to fit the linear trend (timed as model_fit, see metrics.py)
+def fit_model(X, y):
+    with metrics.timed("model_fit", model="LinearRegression") as span:
+        model = LinearRegression().fit(X, y)
+        span.record(rows=len(X), nbytes=X.nbytes + y.nbytes)
+    return model
+
+# The shared instance used by the apps
+model_cache = ModelCache()
+
+# Function to fit one series; returns (next month, predicted amount, whether
+# a cached model was used). Pass cache=None to always retrain.
+def predict_next_month(data, cache=model_cache):
+    X = data[['Month']].values  # Month as the independent variable
+    y = data['Amount'].values  # Amount as the dependent variable
+    if cache is None:
+        model, cached = fit_model(X, y), False
+    else:
+        model, cached = cache.fit(X, y)
+    next_month = np.array([[data['Month'].max() + 1]])
+    return next_month[0][0], model.predict(next_month)[0], cached
+
+# Function to predict the overall series and each bill Type separately (satya3),
+# taking each slice from a billindex.BillIndex;
+# returns {"All": (next month, amount, cached), "Household": ..., "Business": ...}
+def predict_by_type(bill_index, types=("Household", "Business"), cache=model_cache, category="Electricity"):
+    predictions = {"All": predict_next_month(bill_index.query({"Category": category}), cache)}
+    for bill_type in types:
+        predictions[bill_type] = predict_next_month(bill_index.query({"Category": category, "Type": bill_type}), cache)
+    return predictions
+
+# Function to describe, for the page, which models were reused and which retrained
+def cache_report(predictions):
+    cached = [name for name, (_, _, hit) in predictions.items() if hit]
+    retrained = [name for name, (_, _, hit) in predictions.items() if not hit]
+    parts = []
+    if cached:
+        parts.append("cached model used for " + ", ".join(cached))
+    if retrained:
+        parts.append("retrained for " + ", ".join(retrained))
+    return "Prediction models: " + "; ".join(parts)
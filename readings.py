@@ -0,0 +1,374 @@
+import argparse
+import asyncio
+import io
+import os
+import socket
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# Live meter readings for the appliance monitor. Meters (or the simulated
+# feeder below) send one line per reading over TCP:
+#
+#   <item>,<unix seconds>,<kV>        e.g.  Fan,1760781600.25,0.75
+#
+# items being the Item names of appliance_data.xlsx (quoted CSV if they hold
+# a comma). monitor_service.py --readings-port 8765 runs the server; try it
+# with `python readings.py feed --port 8765 --from-store appliance_data.xlsx`.
+#
+# Every appliance keeps its last RING_SIZE readings in a row of fixed-size
+# NumPy ring buffers, and a batch of readings (all those in one network read)
+# is written with a few array operations whatever the number of appliances.
+# Usage is integrated as it arrives: a reading's kV holds until the next one,
+# for at most HOLD_S, and each slot stores the running kV·h total up to its
+# reading. So over the sliding window of the last WINDOW_S seconds (of stream
+# time, the newest reading seen):
+#   window total = running total at the last reading - at the first in window
+#   mean kV      = window total / hours between them
+#   readings/s   = gaps between readings in window / seconds they span
+#   peak kV      = max of BLOCK-sized block maxima kept on write, plus the two
+#                  partial blocks at the window's edges
+# A window holds at most RING_SIZE readings, so a meter sending more than
+# RING_SIZE / WINDOW_S a second gets a shorter one. Total Volts (today's kV·h,
+# what the daily limit is checked against) is the running total less its
+# value at the first reading of the day. The window start only moves forward,
+# so eviction is a short binary search per batch from where it last stopped.
+
+READINGS_PORT = int(os.environ.get("SEMS_READINGS_PORT", "0"))  # 0: no live readings
+WINDOW_S = float(os.environ.get("SEMS_READINGS_WINDOW_S", "900"))
+RING_SIZE = 4096  # readings kept per appliance; a multiple of BLOCK
+BLOCK = 64
+HOLD_S = 60.0  # a reading counts until the next one, but no longer than this
+CHUNK_BYTES = 1 << 18  # largest network read parsed as one batch
+
+# Seconds to add to a Unix time to get local wall-clock time, for day boundaries
+UTC_OFFSET_S = datetime.now().astimezone().utcoffset().total_seconds()
+
+# Function to parse a block of complete protocol lines into (items, unix
+# times, kV) arrays; malformed lines are dropped
+def parse_lines(data):
+    df = pd.read_csv(io.BytesIO(data), header=None, names=["item", "time", "kv"], dtype={"item": str},
+                     on_bad_lines="skip", engine="c")
+    times = pd.to_numeric(df["time"], errors="coerce").to_numpy(np.float64)
+    values = pd.to_numeric(df["kv"], errors="coerce").to_numpy(np.float64)
+    ok = np.isfinite(times) & np.isfinite(values) & df["item"].notna().to_numpy()
+    return df["item"].to_numpy(object)[ok], times[ok], values[ok]
+
+# Function to render readings as protocol lines (the feeder, tests, bench.py)
+def render_lines(items, times, values):
+    df = pd.DataFrame({"item": items, "time": times, "kv": values})
+    return df.to_csv(header=False, index=False, float_format="%.3f").encode()
+
+def _grow(array, rows, fill):
+    grown = np.full((rows,) + array.shape[1:], fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+# Ring buffers and sliding-window aggregates of every appliance seen
+class ReadingWindows:
+    def __init__(self, window_s=WINDOW_S, capacity=RING_SIZE):
+        if capacity % BLOCK:
+            raise ValueError(f"capacity must be a multiple of {BLOCK}")
+        self.window_s = window_s
+        self.capacity = capacity
+        self.slots = {}  # item -> row in the arrays below
+        self.names = []
+        self.now = -np.inf  # stream time: the newest reading seen
+        self.received = 0
+        self.late = 0  # readings older than their appliance's last one, dropped
+        self.rate = 0.0  # readings per second of stream time, over the last second or more
+        self.rate_count = 0
+        self.rate_since = None
+        self.times = np.empty((0, capacity))
+        self.values = np.empty((0, capacity))
+        self.totals = np.empty((0, capacity))  # running kV·h up to each reading
+        self.block_max = np.empty((0, capacity // BLOCK))
+        self.head = np.zeros(0, dtype=np.int64)  # readings written, ever
+        self.tail = np.zeros(0, dtype=np.int64)  # first reading in the window
+        self.last_time = np.zeros(0)
+        self.last_value = np.zeros(0)
+        self.last_total = np.zeros(0)
+        self.day = np.zeros(0, dtype=np.int64)  # local day of the last reading
+        self.day_base = np.zeros(0)  # running total at the first reading that day
+
+    def _slots_of(self, items):
+        inverse, uniques = pd.factorize(items)
+        for item in uniques:
+            if item not in self.slots:
+                self.slots[item] = len(self.names)
+                self.names.append(item)
+        if len(self.names) > len(self.head):
+            self._allocate(max(len(self.names), 2 * len(self.head), 16))
+        return np.array([self.slots[item] for item in uniques], dtype=np.int64)[inverse]
+
+    def _allocate(self, rows):
+        self.times = _grow(self.times, rows, np.nan)
+        self.values = _grow(self.values, rows, np.nan)
+        self.totals = _grow(self.totals, rows, 0.0)
+        self.block_max = _grow(self.block_max, rows, -np.inf)
+        self.head = _grow(self.head, rows, 0)
+        self.tail = _grow(self.tail, rows, 0)
+        self.last_time = _grow(self.last_time, rows, -np.inf)
+        self.last_value = _grow(self.last_value, rows, np.nan)
+        self.last_total = _grow(self.last_total, rows, 0.0)
+        self.day = _grow(self.day, rows, -1)
+        self.day_base = _grow(self.day_base, rows, 0.0)
+
+    # Function to add a batch of readings (any order, any mix of appliances);
+    # returns how many were kept
+    def add(self, items, times, values):
+        if not len(items):
+            return 0
+        slots = self._slots_of(items)
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        order = np.lexsort((times, slots))
+        s, t, v = slots[order], times[order], values[order]
+        late = t < self.last_time[s]
+        if late.any():
+            self.late += int(late.sum())
+            s, t, v = s[~late], t[~late], v[~late]
+        n = len(s)
+        if not n:
+            return 0
+        C = self.capacity
+        idx = np.arange(n)
+        starts = np.empty(n, dtype=bool)
+        starts[0] = True
+        starts[1:] = s[1:] != s[:-1]
+        first = np.maximum.accumulate(np.where(starts, idx, 0))  # start of each reading's appliance run
+        group_slots, group_starts = s[starts], idx[starts]
+        counts = np.diff(np.append(group_starts, n))
+        ends = group_starts + counts - 1
+
+        # Usage since the previous reading, at the previous reading's kV
+        prev_t = np.empty(n)
+        prev_v = np.empty(n)
+        prev_t[1:], prev_v[1:] = t[:-1], v[:-1]
+        prev_t[starts], prev_v[starts] = self.last_time[group_slots], self.last_value[group_slots]
+        increments = np.where(np.isnan(prev_v), 0.0, prev_v * np.minimum(t - prev_t, HOLD_S) / 3600)
+        running = np.cumsum(increments)
+        totals = self.last_total[s] + running - (running[first] - increments[first])
+
+        # Write each appliance's readings after its head, keeping at most C
+        rank = idx - first
+        keep = rank >= np.repeat(counts, counts) - C
+        rows, cells = s[keep], (self.head[s] + rank)[keep] % C
+        self.times[rows, cells] = t[keep]
+        self.values[rows, cells] = v[keep]
+        self.totals[rows, cells] = totals[keep]
+        blocks = np.unique(rows * (C // BLOCK) + cells // BLOCK)
+        block_rows, block_cols = np.divmod(blocks, C // BLOCK)
+        self.block_max[block_rows, block_cols] = self.values.reshape(len(self.head), C // BLOCK, BLOCK)[block_rows, block_cols].max(axis=1)
+
+        # Today's total restarts at the first reading of each day
+        day = np.floor((t + UTC_OFFSET_S) / 86400).astype(np.int64)
+        prev_day = np.empty(n, dtype=np.int64)
+        prev_day[1:] = day[:-1]
+        prev_day[starts] = self.day[group_slots]
+        new_day = idx[day != prev_day]
+        if len(new_day):
+            latest = np.full(len(self.head), -1)
+            np.maximum.at(latest, s[new_day], new_day)
+            changed = latest >= 0
+            self.day_base[changed] = totals[latest[changed]]
+
+        self.head[group_slots] += counts
+        self.last_time[group_slots] = t[ends]
+        self.last_value[group_slots] = v[ends]
+        self.last_total[group_slots] = totals[ends]
+        self.day[group_slots] = day[ends]
+        self.now = max(self.now, t.max())
+        self.received += n
+        self.rate_count += n
+        if self.rate_since is None:
+            self.rate_since = t.min()
+        if self.now - self.rate_since >= 1:
+            self.rate = self.rate_count / (self.now - self.rate_since)
+            self.rate_count, self.rate_since = 0, self.now
+        self._evict()
+        return n
+
+    # Function to move every window's start past the readings older than
+    # WINDOW_S: a binary search between the old start and the head
+    def _evict(self):
+        count = len(self.names)
+        rows = np.arange(count)
+        low = np.maximum(self.tail[:count], self.head[:count] - self.capacity)
+        high = self.head[:count].copy()
+        cutoff = self.now - self.window_s
+        while True:
+            open_ = low < high
+            if not open_.any():
+                break
+            mid = (low + high) // 2
+            older = self.times[rows, mid % self.capacity] < cutoff
+            low = np.where(open_ & older, mid + 1, low)
+            high = np.where(open_ & ~older, mid, high)
+        self.tail[:count] = low
+
+    # Function to get each window's peak from the block maxima: blocks wholly
+    # inside the window, then the cells of the partial blocks at either end
+    def _peaks(self):
+        count = len(self.names)
+        head, tail = self.head[:count], self.tail[:count]
+        blocks = self.capacity // BLOCK
+        first_full, end_full = -(-tail // BLOCK), head // BLOCK
+        head_block = (np.maximum(head, 1) - 1) // BLOCK
+        logical = head_block[:, None] - (head_block[:, None] - np.arange(blocks)[None, :]) % blocks
+        inside = (logical >= first_full[:, None]) & (logical < end_full[:, None])
+        peaks = np.where(inside, self.block_max[:count], -np.inf).max(axis=1)
+        offsets = np.arange(BLOCK)
+        for low, high in ((tail, np.minimum(first_full * BLOCK, head)), (np.maximum(end_full * BLOCK, tail), head)):
+            cells = low[:, None] + offsets[None, :]
+            values = self.values[np.arange(count)[:, None], cells % self.capacity]
+            peaks = np.maximum(peaks, np.where(cells < high[:, None], values, -np.inf).max(axis=1))
+        return np.where(head > tail, peaks, np.nan)
+
+    # Function to get every appliance's window figures and today's total, as a
+    # frame indexed by Item (monitoring.LIVE_COLUMNS and Total Volts, in kV·h)
+    def snapshot(self):
+        count = len(self.names)
+        rows = np.arange(count)
+        head, tail = self.head[:count], self.tail[:count]
+        in_window = head - tail
+        cells = np.minimum(tail, np.maximum(head - 1, 0)) % self.capacity
+        last_time, last_total = self.last_time[:count], self.last_total[:count]
+        window_total = np.where(in_window > 0, last_total - self.totals[rows, cells], 0.0)
+        span = np.where(in_window > 0, last_time - self.times[rows, cells], 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(span > 0, window_total * 3600 / span, self.last_value[:count])
+        today = np.floor((self.now + UTC_OFFSET_S) / 86400) if count else 0
+        last_reading = pd.to_datetime(last_time + UTC_OFFSET_S, unit="s").strftime("%H:%M:%S")
+        return pd.DataFrame({
+            "Live kV": self.last_value[:count],
+            "Peak kV": self._peaks(),
+            "Mean kV": mean,
+            "Window kV·h": window_total,
+            "Readings/s": np.where(span > 0, (in_window - 1) / np.where(span > 0, span, 1), 0.0),
+            "Last Reading": last_reading,
+            "Total Volts": np.where(self.day[:count] == today, last_total - self.day_base[:count], 0.0),
+        }, index=pd.Index(self.names, name="Item", dtype=object))
+
+    def stats(self):
+        count = len(self.names)
+        return {
+            "appliances": count,
+            "received": self.received,
+            "late": self.late,
+            "window_s": self.window_s,
+            "readings_per_second": round(float(self.rate), 1),
+        }
+
+# Line-protocol server feeding a ReadingWindows; runs on the caller's asyncio
+# loop (monitor_service.py). Each network read is parsed and added as one batch.
+class ReadingServer:
+    def __init__(self, windows, host="127.0.0.1", port=READINGS_PORT):
+        self.windows = windows
+        self.host = host
+        self.port = port
+        self.server = None
+        self.connections = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        partial = b""
+        try:
+            while data := await reader.read(CHUNK_BYTES):
+                data = partial + data
+                cut = data.rfind(b"\n") + 1
+                partial = data[cut:]
+                if cut:
+                    self.ingest(data[:cut])
+            if partial.strip():
+                self.ingest(partial + b"\n")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # Function to add one block of complete lines to the windows
+    def ingest(self, data):
+        with metrics.timed("readings_ingest") as span:
+            added = self.windows.add(*parse_lines(data))
+            if span:
+                span.record(rows=added, nbytes=len(data))
+        return added
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+# Function to send simulated readings to a server: `rate` readings a second
+# in total, round-robin over the appliances, for `seconds` seconds. Each
+# appliance draws around its kV (drawn at random when not given) and is off
+# one reading in ten. Returns the number of readings sent.
+def feed(host, port, names, kilovolts=None, rate=1000, seconds=10.0, seed=None, tick=0.1):
+    rng = np.random.default_rng(seed)
+    names = np.asarray(names, dtype=object)
+    kilovolts = rng.uniform(0.1, 5, len(names)) if kilovolts is None else np.asarray(kilovolts, dtype=np.float64)
+    per_tick = max(int(rate * tick), 1)
+    sent = 0
+    started = time.time()
+    with socket.create_connection((host, port)) as sock:
+        while time.time() - started < seconds:
+            tick_start = started + sent / rate
+            which = (sent + np.arange(per_tick)) % len(names)
+            times = tick_start + np.arange(per_tick) / rate
+            values = kilovolts[which] * rng.lognormal(0, 0.1, per_tick) * (rng.random(per_tick) > 0.1)
+            sock.sendall(render_lines(names[which], times, values))
+            sent += per_tick
+            time.sleep(max(started + sent / rate - time.time(), 0))
+    return sent
+
+async def _serve(args):
+    windows = ReadingWindows(args.window)
+    server = ReadingServer(windows, args.host, args.port)
+    port = await server.start()
+    print(f"Listening for readings on {args.host}:{port}")
+    while True:
+        await asyncio.sleep(args.every)
+        print(windows.stats())
+        print(windows.snapshot().head(args.show).to_string())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live appliance readings: a standalone server, or a simulated feeder.")
+    parser.add_argument("action", choices=["serve", "feed"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=READINGS_PORT or 8765)
+    parser.add_argument("--window", type=float, default=WINDOW_S, help="sliding window in seconds (serve)")
+    parser.add_argument("--every", type=float, default=5, help="seconds between printed summaries (serve)")
+    parser.add_argument("--show", type=int, default=10, help="appliances to print (serve)")
+    parser.add_argument("--appliances", type=int, default=100, help="simulated appliances (feed)")
+    parser.add_argument("--from-store", default=None, help="feed the Items and kV of this appliance workbook / store instead")
+    parser.add_argument("--rate", type=float, default=1000, help="readings per second (feed)")
+    parser.add_argument("--seconds", type=float, default=10, help="how long to feed")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.action == "serve":
+        try:
+            asyncio.run(_serve(args))
+        except KeyboardInterrupt:
+            pass
+    else:
+        kilovolts = None
+        if args.from_store:
+            from storage import open_store
+            appliances = open_store(args.from_store).read(columns=["Item", "Kilovolts (kV)"])
+            names, kilovolts = appliances["Item"].astype(str).to_numpy(), pd.to_numeric(appliances["Kilovolts (kV)"], errors="coerce").fillna(0).to_numpy()
+        else:
+            names = [f"Appliance_{i+1}" for i in range(args.appliances)]
+        started = time.perf_counter()
+        sent = feed(args.host, args.port, names, kilovolts, args.rate, args.seconds, args.seed)
+        print(f"Sent {sent} readings in {time.perf_counter() - started:.1f}s")
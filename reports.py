@@ -0,0 +1,87 @@
+from datetime import date
+
+import pandas as pd
+
+import metrics
+
+# Aggregations behind the Graphical Reports pages. The pages and bench.py both
+# call these, so the benchmark numbers follow whatever the pages really run.
+#
+# The pages read a BillRollup of the bills through data_cache.view(): Amount
+# totals and bill counts per Month x Type x Category cell, updated with each
+# inserted bill. Every table and chart is computed from those (at most
+# 12 x types x categories) cells, never from the raw bills.
+
+MONTH_NAMES = {month: date(1900, month, 1).strftime('%B') for month in range(1, 13)}
+
+# Rollup of a bills frame: one row per Month x Type x Category cell (Type is
+# left out for stores without it) holding the Amount total and bill count.
+# append() folds new bills in at a cost independent of the bills already seen.
+class BillRollup:
+    DIMENSIONS = ("Month", "Type", "Category")
+
+    def __init__(self, bills_df):
+        self.dimensions = [column for column in self.DIMENSIONS if column in bills_df.columns]
+        self.cells = self._group(bills_df)
+
+    def _group(self, bills_df):
+        with metrics.timed("groupby", view="bill_rollup") as span:
+            cells = bills_df.groupby(self.dimensions, dropna=False)["Amount"].agg(Amount="sum", Bills="size")
+            if span:
+                span.record(rows=len(bills_df), nbytes=metrics.frame_bytes(bills_df))
+        return cells
+
+    # Function to fold newly inserted bills into the cells
+    def append(self, new_rows):
+        cells = self.cells.add(self._group(new_rows), fill_value=0)
+        self.cells = cells.astype({"Bills": "int64"})
+
+    def __len__(self):
+        return int(self.cells["Bills"].sum())
+
+    # Function to count the bills matching filters (as in storage.py) on the
+    # rollup's dimensions; None when a filter is on any other column
+    def count(self, where=None):
+        cells = self.cells
+        for column, value in (where or {}).items():
+            if column not in self.dimensions:
+                return None
+            level = cells.index.get_level_values(column)
+            cells = cells[level.to_series().between(*value).to_numpy() if isinstance(value, tuple) else level == value]
+        return int(cells["Bills"].sum())
+
+    # Function to list the values of one dimension present in the bills
+    def values(self, column):
+        return sorted(self.cells.index.get_level_values(column).dropna().unique())
+
+    # Function to total Amount over every dimension but `by`
+    def totals(self, by):
+        return self.cells["Amount"].groupby(level=by).sum()
+
+    # Function to return the cells as a table in calendar order, Month as names
+    def table(self):
+        table = self.cells.reset_index()
+        table["Month"] = table["Month"].map(MONTH_NAMES)
+        return table
+
+# Function to total Amount per month name (satya1/satya2 Graphical Reports),
+# in name order as the pages have always listed them
+def monthly_totals(rollup):
+    by_month = rollup.totals("Month")
+    monthly = pd.DataFrame({"Month_Name": by_month.index.map(MONTH_NAMES), "Amount": by_month.to_numpy()})
+    return monthly.sort_values("Month_Name").reset_index(drop=True)
+
+# Function to total Amount per month for each bill Type, in calendar order
+# (satya3 Graphical Reports); returns {type: frame of Month_Name, Amount}
+def monthly_totals_by_type(rollup, types=("Household", "Business")):
+    with metrics.timed("groupby", view="monthly_totals_by_type") as span:
+        by_type_month = rollup.cells["Amount"].groupby(level=["Type", "Month"]).sum()
+        span.record(rows=len(rollup.cells))
+    totals = {}
+    for bill_type in types:
+        if bill_type in by_type_month.index.get_level_values("Type"):
+            monthly = by_type_month.xs(bill_type, level="Type")
+        else:
+            monthly = pd.Series(dtype=float)
+        totals[bill_type] = pd.DataFrame({"Month_Name": monthly.index.map(MONTH_NAMES), "Amount": monthly.to_numpy()})
+    return totals
@@ -1,17 +1,19 @@
 import streamlit as st
-import pandas as pd
 from openpyxl import load_workbook
 from datetime import date
+from storage import open_store
+from datacache import data_cache
+from billindex import BillIndex
+from tableview import paged_table
+from ingest import upload_widget
+from writebuffer import write_buffer
+import metrics
 
-# Define the Excel file path
+# Define the Excel file path (name of the data store; see storage.py)
 EXCEL_FILE = "daily_data.xlsx"
 
-# Ensure the Excel file exists with required columns
-try:
-    df = pd.read_excel(EXCEL_FILE)
-except FileNotFoundError:
-    df = pd.DataFrame(columns=["Month", "Category", "Amount", "Season"])
-    df.to_excel(EXCEL_FILE, index=False)
+# Open the data store behind the Excel file (the workbook is imported on first use; see storage.py)
+store = open_store(EXCEL_FILE, ["Month", "Category", "Amount", "Season"], index=["Month", "Category", "Amount"])
 
 # Sidebar for Navigation
 st.sidebar.title("Navigation")
@@ -33,57 +35,62 @@ if page == "Data Entry":
         submitted = st.form_submit_button("Submit")
         
         if submitted:
-            # Add data to Excel
+            # Add data to the store
             new_data = {"Month": month, "Category": category, "Amount": amount, "Description": description}
-            df = pd.read_excel(EXCEL_FILE)
-            df = pd.concat([df, pd.DataFrame([new_data])], ignore_index=True)
-            df.to_excel(EXCEL_FILE, index=False)
+            write_buffer(store, data_cache).submit(new_data)  # saved at once, committed with other sessions' entries (see writebuffer.py)
             st.success("Data added successfully!")
             st.write(new_data)
 
+    # Many bills at once from a CSV or Parquet export (see ingest.py)
+    upload_widget(store, "daily", data_cache)
+
 # Daily Reports Page
 elif page == "Graphical Reports":
     st.title("Monthly Reports")
     
-    # Load Data
+    # Load Data, sorted and indexed by Month and Category (Month made numeric)
     try:
-        df = pd.read_excel(EXCEL_FILE)
+        bill_index = data_cache.view(store, BillIndex)
     except Exception as e:
-        st.error("Error reading the Excel file. Please ensure the file is properly formatted.")
+        st.error("Error reading the data store. Please ensure it is properly formatted.")
+        metrics.diagnostics_sidebar("satya")  # the page ends here
         st.stop()
     
-    if df.empty:
+    if not len(bill_index):
         st.warning("No data available in the file.")
+        metrics.diagnostics_sidebar("satya")  # the page ends here
         st.stop()
     
-    # Ensure Month column is numeric
-    df["Month"] = pd.to_numeric(df["Month"], errors="coerce")
-    
     # Filter Data by Month
     col1, col2 = st.columns(2)
     start_month = col1.selectbox("Start Month", range(1, 13), format_func=lambda x: date(1900, x, 1).strftime('%B'))
     end_month = col2.selectbox("End Month", range(1, 13), format_func=lambda x: date(1900, x, 1).strftime('%B'))
     
-    # Filtered Data
-    mask = (df["Month"] >= start_month) & (df["Month"] <= end_month)
-    filtered_data = df[mask]
+    # Filtered Data: the month range is one slice of the index
+    filtered_data = bill_index.query({"Month": (start_month, end_month)})
     
     if filtered_data.empty:
         st.warning("No data found for the selected month range.")
     else:
         # Display Data
         st.subheader("Filtered Data")
-        st.write(filtered_data)
+        paged_table(store, "bills", where={"Month": (start_month, end_month)}, filters={"Category": sorted(filtered_data["Category"].dropna().unique())},
+                    sortable=["Month", "Category", "Amount"], count=bill_index.count)
         
         # Summary Table
         st.subheader("Summary by Category")
-        summary = filtered_data.groupby("Category")["Amount"].sum().reset_index()
+        with metrics.timed("groupby", view="summary_by_category") as span:
+            summary = filtered_data.groupby("Category")["Amount"].sum().reset_index()
+            span.record(rows=len(filtered_data))
         st.table(summary)
         
         # Plotting
         st.subheader("Monthly Totals")
-        monthly_totals = filtered_data.groupby("Month")["Amount"].sum().reset_index()
+        with metrics.timed("groupby", view="monthly_totals") as span:
+            monthly_totals = filtered_data.groupby("Month")["Amount"].sum().reset_index()
+            span.record(rows=len(filtered_data))
         monthly_totals["Month_Name"] = monthly_totals["Month"].apply(lambda x: date(1900, x, 1).strftime('%B'))
         st.bar_chart(monthly_totals.set_index("Month_Name")["Amount"])
 
-
+# Timings in the sidebar, when SEMS_METRICS=1 (see metrics.py): last, so they include this run's
+metrics.diagnostics_sidebar("satya")
@@ -1,49 +1,26 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime, date, timedelta
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import time
-from sklearn.linear_model import LinearRegression
-import numpy as np
-
-# Excel file paths
+from datetime import datetime, date
+from storage import open_store
+from datacache import data_cache
+from billindex import BillIndex
+from monitoring import read_monitor_state
+import reports
+from tableview import paged_table
+from ingest import upload_widget
+from writebuffer import write_buffer
+import metrics
+
+# Excel file paths (names of the data stores; see storage.py)
 EXCEL_BILLS = "monthly_bills.xlsx"
 EXCEL_APPLIANCE_DATA = "appliance_data.xlsx"
 
-# Function to send an email
-def send_email(subject, body, receiver_email):
-    sender_email = "v647414@gmail.com"  # Replace with your email
-    sender_password = "kmmz ktrc tgnt ovvf"  # Replace with your App Password
+# Function to open the data store behind an Excel file (the workbook is imported on first use; see storage.py)
+def initialize_excel(file, columns, index=()):
+    return open_store(file, columns, index=index)
 
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = receiver_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
-
-    try:
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, receiver_email, msg.as_string())
-            st.success(f"Email alert sent successfully to {receiver_email}!")
-    except Exception as e:
-        st.error(f"Error sending email: {e}")
-
-# Function to initialize Excel files
-def initialize_excel(file, columns):
-    try:
-        return pd.read_excel(file)
-    except FileNotFoundError:
-        df = pd.DataFrame(columns=columns)
-        df.to_excel(file, index=False)
-        return df
-
-# Initialize files
-bills_df = initialize_excel(EXCEL_BILLS, ["Month", "Category", "Amount", "Description"])
-appliance_data_df = initialize_excel(EXCEL_APPLIANCE_DATA, ["Item", "Kilovolts (kV)", "Start Time", "Max Limit (kV)", "Total Volts", "Email"])
+# Initialize stores
+bills_store = initialize_excel(EXCEL_BILLS, ["Month", "Category", "Amount", "Description"], index=["Month", "Category", "Amount"])
+appliance_store = initialize_excel(EXCEL_APPLIANCE_DATA, ["Item", "Kilovolts (kV)", "Start Time", "Max Limit (kV)", "Total Volts", "Email"])
 
 # Sidebar Navigation
 st.sidebar.title("Navigation")
@@ -63,28 +40,31 @@ if page == "Data Entry for Bills":
         if submitted:
             if amount > 0:
                 new_data = {"Month": month, "Category": category, "Amount": amount, "Description": description}
-                bills_df = pd.concat([bills_df, pd.DataFrame([new_data])], ignore_index=True)
-                bills_df.to_excel(EXCEL_BILLS, index=False)
+                write_buffer(bills_store, data_cache).submit(new_data)  # saved at once, committed with other sessions' entries (see writebuffer.py)
                 st.success("Bill data added successfully!")
                 st.write(new_data)
             else:
                 st.error("Amount must be greater than zero!")
 
+    # Many bills at once from a CSV or Parquet export (see ingest.py)
+    upload_widget(bills_store, "bills", data_cache)
+
 # ---- GRAPHICAL REPORTS SECTION ----
 elif page == "Graphical Reports":
     st.title("Graphical Reports - Monthly Bills")
     try:
-        bills_df = pd.read_excel(EXCEL_BILLS)
-        if bills_df.empty:
+        # Month x Category totals, kept up to date as bills are added
+        rollup = data_cache.view(bills_store, reports.BillRollup)
+        if not len(rollup):
             st.warning("No data available. Please enter bill data first.")
         else:
-            # Display the data
+            # Display the data, one page at a time
             st.subheader("All Bills Data")
-            st.write(bills_df)
+            paged_table(bills_store, "bills", filters={"Month": rollup.values("Month"), "Category": rollup.values("Category")},
+                        sortable=["Month", "Category", "Amount"], labels={"Month": reports.MONTH_NAMES.get}, count=rollup.count)
 
-            # Grouping data by Month
-            bills_df["Month_Name"] = bills_df["Month"].apply(lambda x: date(1900, x, 1).strftime('%B'))
-            monthly_totals = bills_df.groupby("Month_Name")["Amount"].sum().reset_index()
+            # Totals by Month
+            monthly_totals = reports.monthly_totals(rollup)
 
             # Display Summary Table
             st.subheader("Monthly Total Bills")
@@ -119,71 +99,51 @@ elif page == "Appliance Voltage Monitoring":
                 "Total Volts": 0,
                 "Email": email
             }
-            appliance_data_df = pd.concat([appliance_data_df, pd.DataFrame([new_data])], ignore_index=True)
-            appliance_data_df.to_excel(EXCEL_APPLIANCE_DATA, index=False)
+            write_buffer(appliance_store, data_cache).submit(new_data, wait=True)  # committed at once, for the monitoring service to pick up
             st.success(f"Appliance data for '{item}' saved successfully!")
 
-    # Automatic Monitoring Loop
+    # Monitoring Status (cycles and email alerts run in monitor_service.py, not in the page)
     st.subheader("Monitoring Appliances...")
-    progress_bar = st.progress(0)
-
-    for i in range(5):  # Number of auto-refresh cycles
-        for index, row in appliance_data_df.iterrows():
-            item = row["Item"]
-            kilovolts = row["Kilovolts (kV)"]
-            start_time_str = row["Start Time"]
-            max_limit = row["Max Limit (kV)"]
-            email = row["Email"]
-
-            # Calculate total hours since the start time
-            today = datetime.today()
-            start_time = datetime.strptime(start_time_str, "%H:%M")
-            start_datetime = datetime.combine(today, start_time.time())
-            current_time = datetime.now()
-            total_hours = max((current_time - start_datetime).total_seconds() / 3600, 0)  # Ensure non-negative
-            total_volts = round(kilovolts * total_hours, 2)
-
-            # Send email if the limit is exceeded
-            if total_volts > max_limit:
-                subject = f"⚠️Voltage Limit Exceeded for {item}⚠️"
-                body = f"Warning! {item} exceeded its daily voltage limit.\nTotal Volts: {total_volts} kV\nLimit: {max_limit} kV\nPlease Turn Off Your {item}"
-                send_email(subject, body, email)
-                st.warning(f"Alert: {item} exceeded its limit! Email sent to {email}.")
-
-            # Update Total Volts
-            appliance_data_df.at[index, "Total Volts"] = total_volts
-            appliance_data_df.to_excel(EXCEL_APPLIANCE_DATA, index=False)
-
-        progress_bar.progress((i + 1) / 5)
-        time.sleep(1800)  # Pause 10 seconds before the next refresh cycle
-        st.rerun()  # Auto-refresh Streamlit app
+    state = read_monitor_state()
+
+    if state is None:
+        st.info("The monitoring service has not published any results yet. Start it with `python monitor_service.py`.")
+    else:
+        age = datetime.now() - state["updated_at"]
+        st.caption(f"Last cycle #{state['cycle']} at {state['updated_at']:%Y-%m-%d %H:%M:%S} ({int(age.total_seconds() // 60)} min ago), every {int(state['interval_seconds'] // 60)} min")
+        if state.get("outbox"):
+            st.caption("Email alerts: {sent} sent, {suppressed} repeats suppressed, {failed} failed, {queue_depth} queued".format(**state["outbox"]))
+        if (state.get("scheduler") or {}).get("next_crossing"):
+            st.caption("Next limit crossing at {next_crossing}; {pending} appliances still to cross today".format(**state["scheduler"]))
+        if state.get("readings"):
+            st.caption("Live readings: {readings_per_second:.0f}/s from {appliances} meters, in windows of {window_s:.0f} s; metered appliances show today's measured Total Volts".format(**state["readings"]))
+        st.write(state["appliances"])
+        for item, total_volts, max_limit in state["appliances"].loc[state["appliances"]["Over Limit"], ["Item", "Total Volts", "Max Limit (kV)"]].itertuples(index=False):
+            st.warning(f"Alert: {item} exceeded its limit! ({total_volts} kV of {max_limit} kV)")
 
 # ---- ELECTRICITY BILL PREDICTION SECTION ----
 elif page == "Electricity Bill Prediction":
     st.title("Electricity Bill Prediction")
+    import prediction  # loads scikit-learn, so only this page imports it
 
     try:
         # Load data
-        bills_df = pd.read_excel(EXCEL_BILLS)
-        electricity_data = bills_df[bills_df['Category'] == 'Electricity']
+        bill_index = data_cache.view(bills_store, BillIndex)
+        electricity_data = bill_index.query({"Category": "Electricity"})
 
         if electricity_data.empty:
             st.warning("No electricity bill data available. Please enter data first.")
         else:
-            # Prepare the features (X) and target (y)
-            X = electricity_data[['Month']].values  # Month as the independent variable
-            y = electricity_data['Amount'].values  # Amount as the dependent variable
-
-            # Train a linear regression model
-            model = LinearRegression()
-            model.fit(X, y)
-
-            # Predict the amount for the next month
-            next_month = np.array([[electricity_data['Month'].max() + 1]])
-            predicted_amount = model.predict(next_month)
+            # Fit Amount against Month and predict the amount for the next month
+            next_month, predicted_amount, cached = prediction.predict_next_month(electricity_data)
 
             st.subheader("Prediction Result")
-            st.write(f"Predicted Amount for Month {next_month[0][0]}: ₹{int(predicted_amount[0])}")
+            st.write(f"Predicted Amount for Month {next_month}: ₹{int(predicted_amount)}")
+            st.caption("Used the cached model: the bills have not changed since it was fitted" if cached
+                       else "Retrained the model on the current bills")
 
     except Exception as e:
         st.error(f"Error in prediction: {e}")
+
+# Timings in the sidebar, when SEMS_METRICS=1 (see metrics.py): last, so they include this run's
+metrics.diagnostics_sidebar("satya2")
@@ -0,0 +1,37 @@
+import importlib.machinery
+import importlib.util
+import os
+import sys
+from contextlib import contextmanager
+
+# The energy simulator lives in sai.txt, which Python will not import by name.
+# This loads it as the module "sai" so other tools (benchmarks, forecasting,
+# sweeps) can call its functions; process pools pickle them by that name.
+SIMULATOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sai.txt")
+
+# Function to load (once) and return the simulator module
+def load_simulator():
+    if "sai" in sys.modules:
+        return sys.modules["sai"]
+    loader = importlib.machinery.SourceFileLoader("sai", SIMULATOR_PATH)
+    spec = importlib.util.spec_from_loader("sai", loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["sai"] = module
+    try:
+        loader.exec_module(module)
+    except BaseException:
+        del sys.modules["sai"]
+        raise
+    return module
+
+# Temporarily override simulator settings such as NUM_HOUSEHOLDS or BUSINESS_RANGE
+@contextmanager
+def simulator_config(sim, **settings):
+    saved = {name: getattr(sim, name) for name in settings}
+    for name, value in settings.items():
+        setattr(sim, name, value)
+    try:
+        yield sim
+    finally:
+        for name, value in saved.items():
+            setattr(sim, name, value)
@@ -0,0 +1,99 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Cold-start report for the Streamlit apps. Each app script is run once in
+# Streamlit's bare mode (no server; the default page renders) under
+# `python -X importtime`, in a scratch directory with empty stores, and the
+# import log is summarised per top-level module:
+#
+#   python startup.py satya1.py satya2.py satya3.py
+#
+# Heavy dependencies belong to the page that needs them, so the default page
+# must not load any of HEAVY_MODULES, and the whole start must fit in
+# STARTUP_BUDGET_S. bench.py's app_startup case checks both.
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STARTUP_BUDGET_S = float(os.environ.get("SEMS_STARTUP_BUDGET", "1.5"))  # seconds of imports at cold start
+HEAVY_MODULES = {
+    "sklearn": "the Electricity Bill Prediction page",
+    "smtplib": "monitor_service.py",
+    "matplotlib": "the simulator dashboard",
+}
+
+# Function to parse `-X importtime` output into {module: (self s, cumulative s, depth)}
+def parse_importtime(stderr):
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        modules[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6, depth)
+    return modules
+
+# Function to cold-start one app and measure it; returns a dict with the wall
+# time, the total import time, the top-level imports by cost and any heavy
+# modules that were loaded
+def measure_startup(app):
+    script = app if os.path.isabs(app) else os.path.join(APP_DIR, app)
+    scratch = tempfile.mkdtemp(prefix="sems-startup-")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [APP_DIR, os.environ.get("PYTHONPATH")])))
+    env.pop("SEMS_DB", None)
+    env.pop("SEMS_COLUMNAR_DIR", None)
+    try:
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", script], cwd=scratch, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        wall = time.perf_counter() - start
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{app} failed to start:\n{result.stderr[-2000:]}")
+    modules = parse_importtime(result.stderr)
+    top_level = {name: cumulative for name, (_, cumulative, depth) in modules.items() if depth == 0}
+    return {
+        "app": os.path.basename(script),
+        "wall_s": wall,
+        "import_s": sum(top_level.values()),
+        "top_imports": sorted(top_level.items(), key=lambda item: item[1], reverse=True),
+        "heavy_loaded": sorted(name for name in HEAVY_MODULES if name in modules),
+    }
+
+# Function to list what is wrong with a measurement; empty when within budget
+def budget_problems(measurement, budget=STARTUP_BUDGET_S):
+    problems = [f"{measurement['app']} imports {name} at startup; it belongs to {HEAVY_MODULES[name]}"
+                for name in measurement["heavy_loaded"]]
+    if measurement["import_s"] > budget:
+        problems.append(f"{measurement['app']} spends {measurement['import_s']:.2f}s importing at startup "
+                        f"(budget {budget:.2f}s)")
+    return problems
+
+# Function to print one measurement
+def print_report(measurement, top=10):
+    print(f"{measurement['app']}: {measurement['import_s']:.3f}s importing, {measurement['wall_s']:.3f}s to first render")
+    for name, seconds in measurement["top_imports"][:top]:
+        print(f"  {seconds:>8.3f}s  {name}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the cold-start import time of the Streamlit apps.")
+    parser.add_argument("apps", nargs="*", default=["satya1.py", "satya2.py", "satya3.py"])
+    parser.add_argument("--top", type=int, default=10, help="top-level imports to list per app")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_S, help="seconds of imports allowed at startup")
+    args = parser.parse_args()
+
+    problems = []
+    for app in args.apps:
+        measurement = measure_startup(app)
+        print_report(measurement, args.top)
+        problems += budget_problems(measurement, args.budget)
+    if problems:
+        raise SystemExit("\n".join(problems))
+    print(f"All apps start within {args.budget:.2f}s of imports without heavy page dependencies.")
@@ -0,0 +1,710 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# Storage layer for the Streamlit apps. The live data for each workbook
+# (monthly_bills.xlsx, appliance_data.xlsx, ...) is kept in a backend with
+# cheap appends; the Excel files are only imported on first use and exported
+# on request. Pick the backend with SEMS_STORAGE:
+#   sqlite   - one table per workbook in SEMS_DB, indexed columns (default)
+#   columnar - append-only Parquet segments plus a JSON-lines tail per workbook
+#   excel    - the original whole-workbook read/rewrite, kept for comparison
+STORAGE_BACKEND = os.environ.get("SEMS_STORAGE", "sqlite")
+SQLITE_PATH = os.environ.get("SEMS_DB", "sems.db")
+SQLITE_CACHE_MB = int(os.environ.get("SEMS_DB_CACHE_MB", "64"))  # page cache per connection; bulk imports update every index
+COLUMNAR_DIR = os.environ.get("SEMS_COLUMNAR_DIR", "sems_data")
+COMPACT_ROWS = 5000  # tail rows folded into a Parquet segment at a time
+
+# Function to turn a dict, list of dicts or DataFrame into a DataFrame
+def to_frame(records):
+    if isinstance(records, pd.DataFrame):
+        return records
+    if isinstance(records, dict):
+        return pd.DataFrame([records])
+    return pd.DataFrame(list(records))
+
+# Function to convert numpy scalars and NaN to plain Python values for storage
+def to_python(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+# Function to turn a frame into rows of plain Python values (NaN as None),
+# converting a column at a time rather than a value at a time
+def to_rows(df):
+    columns = []
+    for column in df.columns:
+        values = df[column]
+        if values.hasnans:
+            values = values.astype(object).where(values.notna(), None)
+        columns.append(values.tolist())
+    return list(zip(*columns))
+
+# Function to quote a table or column name for SQL ("Kilovolts (kV)" etc.)
+def quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+# Function to get (mtime_ns, size) of a file, or None when it does not exist
+def file_stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+# Filters are {column: value} for equality, or {column: (low, high)} for an
+# inclusive range; every backend accepts them in read(), count() and read_page()
+
+# Function to apply filters to a frame
+def filter_frame(df, where):
+    for column, value in (where or {}).items():
+        if isinstance(value, tuple):
+            df = df[df[column].between(*value)]
+        else:
+            df = df[df[column] == value]
+    return df
+
+# Function to turn filters into a SQL WHERE clause and its parameters
+def where_sql(where):
+    conditions, params = [], []
+    for column, value in (where or {}).items():
+        if isinstance(value, tuple):
+            conditions.append(f"{quote(column)} BETWEEN ? AND ?")
+            params += [to_python(v) for v in value]
+        else:
+            conditions.append(f"{quote(column)} = ?")
+            params.append(to_python(value))
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+# Function to sort a frame for a page and slice the page out of it; the row
+# id breaks ties so pages never overlap
+def page_of_frame(df, limit, offset=0, order_by=None, descending=False):
+    if order_by:
+        df = df.rename_axis("row_id").sort_values([order_by, "row_id"], ascending=not descending,
+                                                  na_position="last" if descending else "first", kind="stable")
+    elif descending:
+        df = df.iloc[::-1]
+    return df.iloc[offset:offset + limit]
+
+# Function to hold an exclusive lock on a lock file, across processes
+@contextmanager
+def file_lock(path):
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+# Timing of every backend's reads and writes (see metrics.py), labelled with
+# the backend and table, counting rows and bytes: the frame's size for SQLite
+# and columnar stores, the workbook's size for Excel ones
+def _store_labels(store, *args, **kwargs):
+    return {"backend": store.backend, "table": store.name}
+
+def _frame_size(store, df):
+    if store.backend == "excel":
+        stat = file_stat(store.path)
+        return stat[1] if stat else 0
+    return metrics.frame_bytes(df)
+
+def _read_rows(result, store, *args, **kwargs):
+    return result if isinstance(result, int) else len(result)
+
+def _read_bytes(result, store, *args, **kwargs):
+    return _frame_size(store, result)
+
+def _written_rows(result, store, records, *args, **kwargs):
+    return len(to_frame(records))
+
+def _written_bytes(result, store, records, *args, **kwargs):
+    return _frame_size(store, to_frame(records))
+
+def _updated_rows(result, store, row_ids, *args, **kwargs):
+    return len(row_ids)
+
+def _one_row(*args, **kwargs):
+    return 1
+
+timed_read = metrics.instrumented("store_read", _store_labels, _read_rows, _read_bytes)
+timed_page = metrics.instrumented("store_read_page", _store_labels, _read_rows, _read_bytes)
+timed_count = metrics.instrumented("store_count", _store_labels)
+timed_append = metrics.instrumented("store_append", _store_labels, _written_rows, _written_bytes)
+timed_replace = metrics.instrumented("store_replace", _store_labels, _written_rows, _written_bytes)
+timed_update = metrics.instrumented("store_update", _store_labels, _updated_rows)
+timed_update_one = metrics.instrumented("store_update", _store_labels, _one_row)
+
+# ---- SQLITE BACKEND ----
+class SQLiteTable:
+    backend = "sqlite"
+
+    def __init__(self, path, name, columns, index=()):
+        self.path = path
+        self.name = name
+        self.lock = threading.Lock()
+        self.version = 0  # bumped on every write through this store
+        self.writes = threading.local()  # signatures around each thread's last write
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+        with self.lock, self.conn:
+            if columns:
+                column_sql = ", ".join(quote(c) for c in columns)
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {quote(name)} ({column_sql})")
+            self.columns = self._table_columns()
+            if not self.columns:
+                raise ValueError(f"No table {name} in {path}; pass its columns to create it")
+            # Another app may have created the table with fewer columns
+            self._ensure_columns(columns or [])
+            for column in index:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {quote(name + '_' + column + '_idx')} ON {quote(name)} ({quote(column)})")
+
+    def _table_columns(self):
+        return [row[1] for row in self.conn.execute(f"PRAGMA table_info({quote(self.name)})")]
+
+    # Columns are untyped, like a workbook: new keys simply become new columns
+    def _ensure_columns(self, columns):
+        for column in columns:
+            if column not in self.columns:
+                self.conn.execute(f"ALTER TABLE {quote(self.name)} ADD COLUMN {quote(column)}")
+                self.columns.append(column)
+
+    @timed_read
+    def read(self, where=None, columns=None):
+        columns = columns or self.columns
+        clause, params = where_sql(where)
+        sql = f"SELECT rowid AS row_id, {', '.join(quote(c) for c in columns)} FROM {quote(self.name)}{clause}"
+        with self.lock:
+            df = pd.read_sql_query(sql + " ORDER BY rowid", self.conn, params=params, index_col="row_id")
+        return df
+
+    # Function to read one page of rows, sorted by order_by (row order when
+    # None; ties broken by row id) and filtered in SQL. after is the
+    # (order_by value, row id) of the last row of the previous page: given it,
+    # the page is found by seeking the index instead of skipping offset rows,
+    # so paging stays as fast at the end of the table as at the start.
+    @timed_page
+    def read_page(self, limit, offset=0, where=None, order_by=None, descending=False, after=None):
+        clause, params = where_sql(where)
+        direction = "DESC" if descending else "ASC"
+        keys = f"{quote(order_by)} {direction}, rowid {direction}" if order_by else f"rowid {direction}"
+        select = f"SELECT rowid AS row_id, {', '.join(quote(c) for c in self.columns)} FROM {quote(self.name)}"
+        stages = [("", [])]
+        if after is not None:
+            stages = self._seek(order_by, descending, to_python(after[0]), to_python(after[1]))
+            offset = 0
+        pages = []
+        with self.lock:
+            for seek, seek_params in stages:
+                condition = " AND ".join(filter(None, [clause[len(" WHERE "):], seek]))
+                sql = f"{select}{' WHERE ' + condition if condition else ''} ORDER BY {keys} LIMIT ? OFFSET ?"
+                pages.append(pd.read_sql_query(sql, self.conn, params=params + seek_params + [limit, offset], index_col="row_id"))
+                limit -= len(pages[-1])
+                if limit <= 0:
+                    break
+        return pd.concat(pages) if len(pages) > 1 else pages[0]
+
+    # Conditions selecting the rows after (value, row_id) in page order, as
+    # stages read one after the other: NULLs sort first ascending and last
+    # descending, and keeping them in their own stage lets every stage seek
+    # the index
+    def _seek(self, order_by, descending, value, row_id):
+        cmp = "<" if descending else ">"
+        if not order_by:
+            return [(f"rowid {cmp} ?", [row_id])]
+        column = quote(order_by)
+        if value is None:
+            stages = [(f"{column} IS NULL AND rowid {cmp} ?", [row_id])]
+            return stages if descending else stages + [(f"{column} IS NOT NULL", [])]
+        stages = [(f"({column}, rowid) {cmp} (?, ?)", [value, row_id])]
+        return stages + [(f"{column} IS NULL", [])] if descending else stages
+
+    # Changes whenever the table may have changed: our own writes bump version,
+    # data_version moves on commits from other connections, and the database
+    # and WAL file stats cover everything else
+    def signature(self):
+        with self.lock:
+            return self._signature()
+
+    def _signature(self):
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return (self.version, data_version, file_stat(self.path), file_stat(self.path + "-wal"))
+
+    # One write transaction. The signatures just before and just after it are
+    # taken under the same lock, so nothing else can land between them and the
+    # write (see write_signatures)
+    @contextmanager
+    def writing(self):
+        with self.lock:
+            before = self._signature()
+            with self.conn:
+                yield
+            self.version += 1
+            self.writes.signatures = (before, self._signature())
+
+    # Function to return (signature before, signature after) this thread's
+    # last write, e.g. for a cache to check that the write was the only change
+    def write_signatures(self):
+        return getattr(self.writes, "signatures", None)
+
+    # Returns the row ids given to the new rows
+    @timed_append
+    def append(self, records):
+        df = to_frame(records)
+        if df.empty:
+            return range(0)
+        rows = to_rows(df)
+        with self.writing():
+            self._ensure_columns(df.columns)
+            placeholders = ", ".join("?" for _ in df.columns)
+            column_sql = ", ".join(quote(c) for c in df.columns)
+            self.conn.executemany(f"INSERT INTO {quote(self.name)} ({column_sql}) VALUES ({placeholders})", rows)
+            last = self.conn.execute(f"SELECT MAX(rowid) FROM {quote(self.name)}").fetchone()[0]
+        return range(last - len(rows) + 1, last + 1)
+
+    @timed_replace
+    def replace(self, records):
+        df = to_frame(records)
+        with self.writing():
+            self.conn.execute(f"DELETE FROM {quote(self.name)}")
+        return self.append(df)
+
+    @timed_update_one
+    def update(self, row_id, values):
+        with self.writing():
+            self._ensure_columns(values)
+            assignments = ", ".join(f"{quote(c)} = ?" for c in values)
+            params = [to_python(v) for v in values.values()] + [to_python(row_id)]
+            self.conn.execute(f"UPDATE {quote(self.name)} SET {assignments} WHERE rowid = ?", params)
+
+    # Batch update: values maps column -> one value per row id, in one transaction
+    @timed_update
+    def update_rows(self, row_ids, values):
+        columns = list(values)
+        rows = [tuple(to_python(values[c][i]) for c in columns) + (to_python(row_id),)
+                for i, row_id in enumerate(row_ids)]
+        with self.writing():
+            self._ensure_columns(columns)
+            assignments = ", ".join(f"{quote(c)} = ?" for c in columns)
+            self.conn.executemany(f"UPDATE {quote(self.name)} SET {assignments} WHERE rowid = ?", rows)
+
+    @timed_count
+    def count(self, where=None):
+        clause, params = where_sql(where)
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {quote(self.name)}{clause}", params).fetchone()[0]
+
+# ---- COLUMNAR BACKEND ----
+# Appends go to a JSON-lines tail (one line per row, O(1)); every COMPACT_ROWS
+# rows the tail is folded into an immutable Parquet segment. Files are
+# numbered: tail-N is compacted into segment-N, which is written to a temp
+# name and renamed, so a tail whose segment already exists is a leftover from
+# an interrupted compaction and is dropped. replace() writes snapshot-N, which
+# supersedes every file numbered N or below. Row ids are positions in read order.
+# Several processes (the apps, monitor_service.py) may share a directory: every
+# operation holds the directory's file lock and re-scans the files first, so
+# none of them works from a stale list of segments.
+class ColumnarTable:
+    backend = "columnar"
+
+    def __init__(self, root, name, columns):
+        self.dir = os.path.join(root, name)
+        self.name = name
+        self.columns = list(columns or [])
+        self.lock = threading.Lock()
+        self.row_counts = {}  # (segment path, mtime_ns) -> rows; segments never change
+        self.writes = threading.local()  # signatures around each thread's last write
+        os.makedirs(self.dir, exist_ok=True)
+        self.lock_path = os.path.join(self.dir, ".lock")
+        with self.locked():
+            pass
+
+    # Exclusive access to the directory, across threads and processes
+    @contextmanager
+    def locked(self):
+        with self.lock, file_lock(self.lock_path):
+            self._recover()
+            yield
+
+    # A write, with the directory's signature just before and just after it
+    # taken under its lock (see write_signatures)
+    @contextmanager
+    def writing(self):
+        with self.locked():
+            before = self._signature()
+            yield
+            self.writes.signatures = (before, self._signature())
+
+    # Function to return (signature before, signature after) this thread's
+    # last write, e.g. for a cache to check that the write was the only change
+    def write_signatures(self):
+        return getattr(self.writes, "signatures", None)
+
+    def _numbered(self, prefix, suffix):
+        found = {}
+        for path in glob.glob(os.path.join(self.dir, f"{prefix}-*{suffix}")):
+            found[int(os.path.basename(path)[len(prefix) + 1:-len(suffix)])] = path
+        return found
+
+    def _recover(self):
+        snapshots = self._numbered("snapshot", ".parquet")
+        self.base = max(snapshots, default=0)
+        segments = {}
+        for n, path in self._numbered("segment", ".parquet").items():
+            if n > self.base:
+                segments[n] = path
+            else:
+                os.remove(path)
+        for n, path in self._numbered("tail", ".jsonl").items():
+            if n <= self.base or n in segments:
+                os.remove(path)
+        for n, path in snapshots.items():
+            if n < self.base:
+                os.remove(path)
+        self.segments = [snapshots[self.base]] if self.base else []
+        self.segments += [segments[n] for n in sorted(segments)]
+        self.seq = max([self.base] + list(segments)) + 1
+        self.segment_rows = self._count_segment_rows(self.segments)
+        self.tail_path = os.path.join(self.dir, f"tail-{self.seq:06d}.jsonl")
+        self.tail_rows = 0
+        if os.path.exists(self.tail_path):
+            with open(self.tail_path, "rb+") as f:
+                data = f.read()
+                # Cut a half-written last line left by a crash mid-append (only
+                # then: a truncate moves the mtime, and with it signature())
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+                self.tail_rows = data.count(b"\n")
+        for column in self._segment_columns() + list(self._read_tail().columns):
+            if column not in self.columns:
+                self.columns.append(column)
+
+    def _count_segment_rows(self, paths):
+        if not paths:
+            return 0
+        import pyarrow.parquet as pq
+        counts = {}
+        for path in paths:
+            key = (path, os.stat(path).st_mtime_ns)
+            counts[key] = self.row_counts.get(key) or pq.ParquetFile(path).metadata.num_rows
+        self.row_counts = counts
+        return sum(counts.values())
+
+    def _segment_columns(self):
+        if not self.segments:
+            return []
+        import pyarrow.parquet as pq
+        return pq.read_schema(self.segments[-1]).names
+
+    def _read_tail(self):
+        if not self.tail_rows:
+            return pd.DataFrame(columns=self.columns)
+        with open(self.tail_path) as f:
+            return pd.DataFrame([json.loads(line) for line in f])
+
+    # Row groups of COMPACT_ROWS let a page be read without the whole snapshot
+    def _write_segment(self, df, prefix):
+        path = os.path.join(self.dir, f"{prefix}-{self.seq:06d}.parquet")
+        df.reset_index(drop=True).to_parquet(path + ".tmp", index=False, row_group_size=COMPACT_ROWS)
+        os.replace(path + ".tmp", path)
+        return path
+
+    # Function to fold the tail, followed by any new rows, into a segment
+    def _compact(self, new_rows=None):
+        parts = [self._read_tail()] if self.tail_rows else []
+        if new_rows is not None:
+            parts.append(new_rows.reset_index(drop=True))
+        df = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        path = self._write_segment(df, "segment")
+        if os.path.exists(self.tail_path):
+            os.remove(self.tail_path)
+        self.segments.append(path)
+        self.segment_rows += len(df)
+        self.seq += 1
+        self.tail_path = os.path.join(self.dir, f"tail-{self.seq:06d}.jsonl")
+        self.tail_rows = 0
+
+    def _read(self, where=None, columns=None):
+        columns = columns or self.columns
+        filters = None
+        if where:
+            filters = []
+            for column, value in where.items():
+                if isinstance(value, tuple):
+                    filters += [(column, ">=", to_python(value[0])), (column, "<=", to_python(value[1]))]
+                else:
+                    filters.append((column, "==", to_python(value)))
+        parts = [pd.read_parquet(path, filters=filters) for path in self.segments]
+        parts.append(filter_frame(self._read_tail(), where))
+        parts = [p.reindex(columns=columns) for p in parts if len(p)]
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(parts, ignore_index=True)
+
+    def _replace(self, df):
+        df = df.reindex(columns=self.columns)
+        self._write_segment(df, "snapshot")
+        self._recover()
+        return len(df)
+
+    @timed_read
+    def read(self, where=None, columns=None):
+        with self.locked():
+            return self._read(where, columns)
+
+    # Function to read rows start..stop-1 (positions in read order), touching
+    # only the row groups and tail that hold them
+    def _read_rows(self, start, stop):
+        import pyarrow.parquet as pq
+        parts = []
+        first = 0
+        for path in self.segments:
+            parquet = pq.ParquetFile(path)
+            rows = parquet.metadata.num_rows
+            if first < stop and start < first + rows:
+                groups, group_first, offset = [], first, None
+                for i in range(parquet.num_row_groups):
+                    group_rows = parquet.metadata.row_group(i).num_rows
+                    if group_first < stop and start < group_first + group_rows:
+                        offset = group_first if offset is None else offset
+                        groups.append(i)
+                    group_first += group_rows
+                part = parquet.read_row_groups(groups).to_pandas()
+                parts.append(part.iloc[max(start - offset, 0):stop - offset].set_axis(
+                    pd.RangeIndex(max(start, offset), min(stop, offset + len(part)))))
+            first += rows
+        if first < stop and self.tail_rows:
+            tail = self._read_tail()
+            parts.append(tail.iloc[max(start - first, 0):stop - first].set_axis(
+                pd.RangeIndex(max(start, first), min(stop, first + len(tail)))))
+        parts = [p.reindex(columns=self.columns) for p in parts if len(p)]
+        df = pd.concat(parts) if parts else pd.DataFrame(columns=self.columns)
+        return df.rename_axis("row_id")
+
+    # Function to read one page of rows. In row order only the segments that
+    # hold the page are read; sorting or filtering needs a pass over the table.
+    # after is accepted for compatibility with SQLiteTable and ignored.
+    @timed_page
+    def read_page(self, limit, offset=0, where=None, order_by=None, descending=False, after=None):
+        with self.locked():
+            if not where and not order_by:
+                total = self.segment_rows + self.tail_rows
+                if descending:
+                    stop = max(total - offset, 0)
+                    return self._read_rows(max(stop - limit, 0), stop).iloc[::-1]
+                return self._read_rows(offset, offset + limit)
+            df = filter_frame(self._read().rename_axis("row_id"), where)
+        return page_of_frame(df, limit, offset, order_by, descending)
+
+    # The directory listing changes with every append, compaction and
+    # snapshot, whichever process made it
+    def signature(self):
+        with self.lock:
+            return self._signature()
+
+    def _signature(self):
+        with os.scandir(self.dir) as entries:
+            return tuple(sorted((e.name, e.stat().st_mtime_ns, e.stat().st_size)
+                                for e in entries if e.name != ".lock" and not e.name.endswith(".tmp")))
+
+    # Returns the row ids (positions) given to the new rows. A batch of
+    # COMPACT_ROWS or more skips the tail and is written with it as a segment.
+    @timed_append
+    def append(self, records):
+        df = to_frame(records)
+        if df.empty:
+            return range(0)
+        with self.writing():
+            for column in df.columns:
+                if column not in self.columns:
+                    self.columns.append(column)
+            first = self.segment_rows + self.tail_rows
+            if len(df) >= COMPACT_ROWS:
+                self._compact(df)
+                return range(first, first + len(df))
+            lines = "".join(json.dumps(dict(zip(df.columns, row))) + "\n" for row in to_rows(df))
+            with open(self.tail_path, "a") as f:
+                f.write(lines)
+            self.tail_rows += len(df)
+            if self.tail_rows >= COMPACT_ROWS:
+                self._compact()
+        return range(first, first + len(df))
+
+    @timed_replace
+    def replace(self, records):
+        with self.writing():
+            return self._replace(to_frame(records))
+
+    # Segments are immutable, so an update rewrites the table as a snapshot
+    def update(self, row_id, values):
+        self.update_rows([row_id], {c: [v] for c, v in values.items()})
+
+    @timed_update
+    def update_rows(self, row_ids, values):
+        with self.writing():
+            df = self._read()
+            for column, column_values in values.items():
+                df[column] = df[column].astype(object) if column in df else None
+                df.loc[list(row_ids), column] = list(column_values)
+                if column not in self.columns:
+                    self.columns.append(column)
+            self._replace(df.infer_objects())
+
+    # Unfiltered counts come from the Parquet metadata and the tail line count
+    @timed_count
+    def count(self, where=None):
+        with self.locked():
+            if not where:
+                return self.segment_rows + self.tail_rows
+            return len(self._read(where, list(where)))
+
+# ---- EXCEL BACKEND ----
+# The original behaviour: every write re-reads and rewrites the whole workbook
+class ExcelTable:
+    # Values do not round-trip exactly (1.0 comes back as 1, '' as NaN), so
+    # caches should re-read rather than patch their copy after a write
+    patch_on_write = False
+    backend = "excel"
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.lock = threading.Lock()
+        if not os.path.exists(path):
+            pd.DataFrame(columns=columns).to_excel(path, index=False)
+
+    def signature(self):
+        return file_stat(self.path)
+
+    @property
+    def columns(self):
+        return list(pd.read_excel(self.path, nrows=0).columns)
+
+    @timed_read
+    def read(self, where=None, columns=None):
+        df = filter_frame(pd.read_excel(self.path), where)
+        return df[columns] if columns else df
+
+    @timed_append
+    def append(self, records):
+        df = to_frame(records)
+        with self.lock:
+            existing = pd.read_excel(self.path)
+            combined = pd.concat([existing, df], ignore_index=True)
+            combined.to_excel(self.path, index=False)
+        return range(len(existing), len(existing) + len(df))
+
+    @timed_replace
+    def replace(self, records):
+        df = to_frame(records)
+        with self.lock:
+            df.to_excel(self.path, index=False)
+        return len(df)
+
+    def update(self, row_id, values):
+        self.update_rows([row_id], {c: [v] for c, v in values.items()})
+
+    @timed_update
+    def update_rows(self, row_ids, values):
+        with self.lock:
+            df = pd.read_excel(self.path)
+            for column, column_values in values.items():
+                df[column] = df[column].astype(object) if column in df else None
+                df.loc[list(row_ids), column] = list(column_values)
+            df.infer_objects().to_excel(self.path, index=False)
+
+    @timed_page
+    def read_page(self, limit, offset=0, where=None, order_by=None, descending=False, after=None):
+        return page_of_frame(self.read(where).rename_axis("row_id"), limit, offset, order_by, descending)
+
+    @timed_count
+    def count(self, where=None):
+        return len(self.read(where))
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+# Function to open (or reuse) the store behind an Excel workbook path.
+# Stores are shared process-wide, so every Streamlit session uses the same
+# connection. On first use an existing workbook is imported into the backend.
+def open_store(excel_file, columns=None, backend=None, index=()):
+    backend = backend or STORAGE_BACKEND
+    name = os.path.splitext(os.path.basename(excel_file))[0]
+    key = (backend, os.path.abspath(excel_file))
+    with _stores_lock:
+        if key in _stores:
+            return _stores[key]
+        if backend == "sqlite":
+            store = SQLiteTable(SQLITE_PATH, name, columns, index)
+        elif backend == "columnar":
+            store = ColumnarTable(COLUMNAR_DIR, name, columns)
+        elif backend == "excel":
+            store = ExcelTable(excel_file, columns)
+        else:
+            raise ValueError(f"Unknown storage backend: {backend}")
+        if backend != "excel" and store.count() == 0 and os.path.exists(excel_file):
+            store.append(pd.read_excel(excel_file))
+        _stores[key] = store
+        return store
+
+# Function to identify a store across processes, e.g. to name its ingest
+# checkpoints and write-behind log: its file or directory and table
+def store_id(store):
+    location = os.path.abspath(getattr(store, "dir", None) or store.path)
+    return hashlib.sha256(f"{location}:{getattr(store, 'name', '')}".encode()).hexdigest()[:16]
+
+# Function to write a store's rows out as an Excel workbook
+def export_excel(store, path):
+    store.read().to_excel(path, index=False)
+
+# Function to append the rows of an Excel workbook to a store
+def import_excel(store, path):
+    return store.append(pd.read_excel(path))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import or export the app data stores as Excel workbooks.")
+    parser.add_argument("action", choices=["import", "export", "count"])
+    parser.add_argument("workbook", help="workbook the store belongs to, e.g. monthly_bills.xlsx")
+    parser.add_argument("--file", default=None, help="Excel file to read or write (defaults to the workbook path)")
+    parser.add_argument("--backend", choices=["sqlite", "columnar"], default=None)
+    args = parser.parse_args()
+
+    file = args.file or args.workbook
+    if args.action == "import":
+        store = open_store(args.workbook, list(pd.read_excel(file, nrows=0).columns), args.backend)
+        if file != args.workbook:
+            print(f"Imported {len(import_excel(store, file))} rows from {file}")
+        print(f"{store.count()} rows in store")
+    elif args.action == "export":
+        store = open_store(args.workbook, backend=args.backend)
+        export_excel(store, file)
+        print(f"Exported {store.count()} rows to {file}")
+    else:
+        print(open_store(args.workbook, backend=args.backend).count())
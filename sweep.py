@@ -0,0 +1,217 @@
+import argparse
+import datetime
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from simulator import SIMULATOR_PATH, load_simulator, simulator_config
+
+# Scenario sweeps over the energy simulator's settings (sai.txt). A grid of
+# settings is expanded into scenarios, which run in parallel on a process
+# pool, each keeping only its rollups (simulate_energy_rollups):
+#
+#   python sweep.py --vary NUM_HOUSEHOLDS "[5000, 10000, 20000]" \
+#                   --vary HOUSEHOLD_RANGE "[[5, 30], [10, 40]]" --seed 1
+#   python sweep.py --grid scenarios.json --workers 4 --out comparison.csv
+#
+# A grid file maps setting names to lists of values (every combination is a
+# scenario), or holds a list of scenarios, each a dict of settings. Settings
+# not given keep their value in sai.txt.
+#
+# Each scenario's rollups (daily totals by Type, per-entity totals) and
+# summary statistics are cached in SWEEP_CACHE_DIR/<key>, the key hashing the
+# complete settings, the seed and the simulator's source, so a scenario that
+# has not changed is loaded instead of simulated, and editing sai.txt starts
+# afresh. The rollups are stored by day number; dates are attached on load.
+# The sweep ends with one comparison row per scenario.
+
+SWEEP_CACHE_DIR = os.environ.get("SEMS_SWEEP_CACHE", "sweep_cache")
+SETTINGS = ["NUM_HOUSEHOLDS", "NUM_BUSINESSES", "SIMULATION_DAYS", "HOUSEHOLD_RANGE", "BUSINESS_RANGE", "BUSINESS_SIZES"]
+
+# Function to expand a grid ({setting: [values]}, or a list of scenario
+# dicts) into a list of scenarios
+def expand_grid(grid):
+    if isinstance(grid, list):
+        return [dict(scenario) for scenario in grid]
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+# Function to fill in a scenario's missing settings from sai.txt and bring
+# values read from JSON back to the simulator's types (ranges are tuples)
+def resolve(scenario, sim=None):
+    sim = sim or load_simulator()
+    unknown = set(scenario) - set(SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown simulator settings: {', '.join(sorted(unknown))} (expected some of {', '.join(SETTINGS)})")
+    config = {name: scenario.get(name, getattr(sim, name)) for name in SETTINGS}
+    config["HOUSEHOLD_RANGE"] = tuple(config["HOUSEHOLD_RANGE"])
+    config["BUSINESS_RANGE"] = {size: tuple(bounds) for size, bounds in config["BUSINESS_RANGE"].items()}
+    config["BUSINESS_SIZES"] = list(config["BUSINESS_SIZES"])
+    return config
+
+_simulator_digest = None
+
+# Function to compute a scenario's cache key from its complete settings, the
+# seed and the simulator source
+def scenario_key(config, seed):
+    global _simulator_digest
+    if _simulator_digest is None:
+        with open(SIMULATOR_PATH, "rb") as f:
+            _simulator_digest = hashlib.sha256(f.read()).hexdigest()
+    text = json.dumps({"config": config, "seed": seed, "simulator": _simulator_digest}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+# Function to name a scenario by the settings that vary across the sweep
+def scenario_name(scenario, varied):
+    return ", ".join(f"{name}={scenario[name]}" for name in varied) or "sai.txt settings"
+
+# Function to compute the summary statistics of one scenario's rollups
+def summarize(by_type, entity_totals):
+    daily = by_type.sum(axis=1)
+    annual = entity_totals["Energy_Usage_kWh"]
+    stats = {
+        "Entities": len(entity_totals),
+        "Total kWh": float(daily.sum()),
+        "Mean daily kWh": float(daily.mean()),
+        "Daily std kWh": float(daily.std()),
+        "Peak daily kWh": float(daily.max()),
+        "Peak day": int(daily.idxmax()),
+        "Entity p50 kWh": float(annual.quantile(0.5)),
+        "Entity p95 kWh": float(annual.quantile(0.95)),
+    }
+    for label, total in by_type.sum().items():
+        stats[f"{label} share %"] = float(100 * total / daily.sum())
+    return stats
+
+# Pool task: simulate one scenario's rollups and write them and their
+# summary to the cache. Written to a temporary directory renamed into place,
+# so a crashed or concurrent run never leaves a half-written entry.
+def run_scenario(task):
+    config, seed, key, cache_dir = task
+    started = time.perf_counter()
+    sim = load_simulator()
+    with simulator_config(sim, **config):
+        rollups = sim.simulate_energy_rollups(seed=seed)
+    by_type = rollups.daily_totals_by_type().reset_index(drop=True).rename_axis("Day")
+    entity_totals = rollups.entity_totals()
+    summary = {"key": key, "seed": seed, "config": config, "seconds": time.perf_counter() - started,
+               "stats": summarize(by_type, entity_totals)}
+    os.makedirs(cache_dir, exist_ok=True)
+    scratch = tempfile.mkdtemp(dir=cache_dir, prefix=f".{key}-")
+    try:
+        by_type.to_parquet(os.path.join(scratch, "daily_by_type.parquet"))
+        entity_totals.to_parquet(os.path.join(scratch, "entity_totals.parquet"), index=False)
+        with open(os.path.join(scratch, "summary.json"), "w") as f:
+            json.dump(summary, f, indent=1)
+        try:
+            os.rename(scratch, os.path.join(cache_dir, key))
+        except OSError:  # another run cached it first
+            pass
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return summary
+
+# Function to read a cached scenario's summary, or None when it is not cached
+def cached_summary(key, cache_dir=SWEEP_CACHE_DIR):
+    try:
+        with open(os.path.join(cache_dir, key, "summary.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+# Function to load a cached scenario's rollups as sai's EnergyRollups, dated
+# from start_date (today by default), e.g. for dashboard.render_dashboard
+def load_rollups(key, cache_dir=SWEEP_CACHE_DIR, start_date=None):
+    sim = load_simulator()
+    by_type = pd.read_parquet(os.path.join(cache_dir, key, "daily_by_type.parquet"))
+    entity_totals = pd.read_parquet(os.path.join(cache_dir, key, "entity_totals.parquet"))
+    start_date = start_date or datetime.date.today()
+    dates = np.array([start_date + datetime.timedelta(days=i) for i in range(len(by_type))], dtype=object)
+    rollups = sim.EnergyRollups(dates)
+    rollups.add_sums(entity_totals["Entity"].tolist(), entity_totals["Type"].tolist(),
+                     {label: by_type[label].to_numpy() for label in by_type.columns},
+                     entity_totals["Energy_Usage_kWh"].to_numpy())
+    return rollups
+
+# Function to run a sweep: every scenario is loaded from the cache or
+# simulated on a pool of `workers` processes. Returns the comparison table,
+# one row per scenario in grid order.
+def sweep(scenarios, seed=0, workers=None, cache_dir=SWEEP_CACHE_DIR, refresh=False, progress=None):
+    if seed is None:
+        raise ValueError("Scenarios are cached by seed; pass one")
+    sim = load_simulator()
+    configs = [resolve(scenario, sim) for scenario in scenarios]
+    keys = [scenario_key(config, seed) for config in configs]
+    summaries = {} if refresh else {key: summary for key in set(keys) if (summary := cached_summary(key, cache_dir))}
+    todo = list({key: config for key, config in zip(keys, configs) if key not in summaries}.items())
+    if todo:
+        tasks = [(config, seed, key, cache_dir) for key, config in todo]
+        workers = min(workers or os.cpu_count(), len(tasks))
+        if refresh:
+            for key, _ in todo:
+                shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                results = list(_reported(pool.imap_unordered(run_scenario, tasks), progress))
+        else:
+            results = list(_reported(map(run_scenario, tasks), progress))
+        for summary in results:
+            summaries[summary["key"]] = dict(summary, simulated=True)
+
+    varied = [name for name in SETTINGS if len({json.dumps(config[name], sort_keys=True) for config in configs}) > 1]
+    rows = []
+    for scenario, config, key in zip(scenarios, configs, keys):
+        summary = summaries[key]
+        rows.append({"Scenario": scenario_name(config, varied), "Key": key,
+                     "Cached": not summary.get("simulated", False), "Sim seconds": round(summary["seconds"], 2),
+                     **summary["stats"]})
+    return pd.DataFrame(rows)
+
+def _reported(summaries, progress):
+    for summary in summaries:
+        if progress:
+            progress(summary)
+        yield summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the energy simulator over a grid of settings and compare the results.")
+    parser.add_argument("--grid", default=None, help="JSON file: {setting: [values]} or a list of scenarios")
+    parser.add_argument("--vary", nargs=2, action="append", default=[], metavar=("SETTING", "VALUES"),
+                        help='a setting and a JSON list of its values, e.g. --vary NUM_HOUSEHOLDS "[5000, 10000]"')
+    parser.add_argument("--seed", type=int, default=0, help="seed shared by every scenario")
+    parser.add_argument("--workers", type=int, default=None, help="processes to simulate on (default: one per CPU)")
+    parser.add_argument("--cache", default=SWEEP_CACHE_DIR, help="directory of cached scenario results")
+    parser.add_argument("--refresh", action="store_true", help="simulate every scenario again, replacing cached results")
+    parser.add_argument("--out", default=None, help="also save the comparison table (.csv or .parquet)")
+    args = parser.parse_args()
+
+    grid = {}
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    if args.vary:
+        if isinstance(grid, list):
+            parser.error("--vary cannot be combined with a list of scenarios")
+        grid.update({name: json.loads(values) for name, values in args.vary})
+    scenarios = expand_grid(grid) if grid else [{}]
+
+    started = time.perf_counter()
+    table = sweep(scenarios, args.seed, args.workers, args.cache, args.refresh,
+                  progress=lambda summary: print(f"Simulated {summary['key']} in {summary['seconds']:.1f}s"))
+    print(f"\n{len(table)} scenarios ({int(table['Cached'].sum())} from cache) in {time.perf_counter() - started:.1f}s\n")
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:,.1f}".format):
+        print(table.drop(columns=["Key"]).to_string(index=False))
+    if args.out:
+        if args.out.endswith(".parquet"):
+            table.to_parquet(args.out, index=False)
+        else:
+            table.to_csv(args.out, index=False)
+        print(f"\nSaved to {args.out}")
@@ -0,0 +1,62 @@
+import math
+
+import streamlit as st
+
+# Paged table for the Reports pages. Only the rows on screen are fetched:
+# sorting and filtering run in the store (see read_page in storage.py) and
+# the total comes from count(), or from a cheaper count function such as a
+# rollup's. Moving to the next page continues from the last row of the
+# previous one (a keyset seek in SQLite), so every page costs about the same
+# however large the table is.
+
+PAGE_SIZES = [25, 50, 100, 250]
+ROW_ORDER = "Row order"
+
+# Function to show a store's rows one page at a time. where is applied
+# before the user's filters; filters maps a column to the values offered for
+# it; sortable lists the columns the user may sort by (index them in the
+# store); labels maps a column to a function formatting its filter values;
+# count(where) may return the total, or None to have the store count it.
+def paged_table(store, key, where=None, filters=None, sortable=(), labels=None, count=None):
+    labels = labels or {}
+    controls = st.columns(2 + len(filters or {}))
+    order_by = controls[0].selectbox("Sort by", [ROW_ORDER] + list(sortable), key=f"{key}_sort")
+    order_by = None if order_by == ROW_ORDER else order_by
+    descending = controls[1].checkbox("Descending", key=f"{key}_desc")
+    where = dict(where or {})
+    for column, control in zip(filters or {}, controls[2:]):
+        label = labels.get(column, str)
+        choice = control.selectbox(column, [None] + list(filters[column]), key=f"{key}_filter_{column}",
+                                   format_func=lambda value, label=label: "All" if value is None else label(value))
+        if choice is not None:
+            where[column] = choice
+
+    total = count(where) if count else None
+    if total is None:
+        total = store.count(where)
+    left, right = st.columns(2)
+    page_size = right.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_size")
+    pages = max(math.ceil(total / page_size), 1)
+
+    # A new sort, filter or page size starts again at page 1. The last row of
+    # each page seen is kept for the next page's seek, until the query changes
+    # or the store is written to.
+    query = (tuple(sorted(where.items())), order_by, descending, page_size)
+    bookmarks = st.session_state.get(f"{key}_bookmarks")
+    if bookmarks is None or bookmarks["query"] != query:
+        st.session_state[f"{key}_page"] = 1
+    elif st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages  # rows were removed
+    signature = store.signature()
+    if bookmarks is None or bookmarks["query"] != query or bookmarks["signature"] != signature:
+        bookmarks = st.session_state[f"{key}_bookmarks"] = {"query": query, "signature": signature, "pages": {}}
+    page = left.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    after = bookmarks["pages"].get(page - 1)
+    rows = store.read_page(page_size, (page - 1) * page_size, where, order_by, descending, after)
+    if len(rows):
+        bookmarks["pages"][page] = (rows[order_by].iloc[-1] if order_by else None, rows.index[-1])
+
+    first = (page - 1) * page_size
+    st.caption(f"Rows {first + 1 if len(rows) else 0}-{first + len(rows)} of {total}")
+    st.dataframe(rows)
+    return rows
@@ -0,0 +1,250 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+import metrics
+from storage import file_lock, open_store, store_id, to_frame, to_python, to_rows
+
+# Write-behind buffer for the data-entry forms. With several sessions (and
+# several apps: satya1-3 share monthly_bills.xlsx) submitting at once, every
+# form used to do its own read-modify-write of the store, which loses rows on
+# the Excel backend and makes the writes queue up on the others.
+#
+#   buffer = write_buffer(bills_store, data_cache)
+#   buffer.submit(new_bill)              # durable on return
+#   buffer.submit(new_appliance, wait=True)  # ... and committed to the store
+#
+# submit() appends the rows as one JSON line to the store's log in WAL_DIR and
+# fsyncs it, under the log's file lock, then returns: once it has returned the
+# rows survive a crash. A flusher thread in each process commits the log to
+# the store in groups, every FLUSH_INTERVAL_S or once FLUSH_ROWS rows are
+# waiting: it takes the store's flush lock (one committer across processes),
+# renames the log aside so submits carry on into a fresh one, and appends
+# everything in it with a single store.append(). Rows from every session and
+# process land in one transaction, or one workbook rewrite on Excel.
+#
+# Crash recovery: a log left behind is committed by the next flush, in any
+# process. Before appending, the committer writes a marker with the store's
+# row count; finding the marker and the renamed log again means the append may
+# or may not have happened. Other writers (uploads, other apps) may have
+# appended since, so the count alone cannot tell: the rows after it are
+# searched for the batch itself, which one append put there in one piece, so
+# no row is lost or added twice. A torn last line (a submit that crashed
+# before its fsync, so was never acknowledged) is skipped.
+
+WAL_DIR = os.environ.get("SEMS_WAL_DIR", "sems_wal")
+WAL_FSYNC = os.environ.get("SEMS_WAL_FSYNC", "1") != "0"  # 0: faster, loses acknowledged rows on power failure
+FLUSH_INTERVAL_S = float(os.environ.get("SEMS_WAL_FLUSH_S", "0.25"))
+FLUSH_ROWS = 500  # wake the flusher early once this many rows are waiting
+
+log = logging.getLogger("writebuffer")
+
+class WriteBuffer:
+    def __init__(self, store, cache=None, log_dir=WAL_DIR, interval=FLUSH_INTERVAL_S, flush_rows=FLUSH_ROWS):
+        self.store = store
+        self.cache = cache  # a DataCache to commit through, so cached views are patched
+        self.interval = interval
+        self.flush_rows = flush_rows
+        os.makedirs(log_dir, exist_ok=True)
+        base = os.path.join(log_dir, f"{store.name}-{store_id(store)}")
+        self.log_path = base + ".log"
+        self.log_lock = base + ".log.lock"
+        self.pending_path = base + ".pending"  # the log being committed
+        self.marker_path = base + ".commit"  # {"count_before", "rows"} while committing
+        self.flush_lock = base + ".flush.lock"
+        self.lock = threading.Lock()
+        self.waiting = 0  # rows submitted by this process since its last flush
+        self.submitted = 0
+        self.committed = 0
+        self.commits = 0
+        self.recovered = 0
+        self.commit_seconds = 0.0
+        self.stopping = False
+        self.wake = threading.Event()
+        self.flush()  # commit whatever a crashed process left behind
+        self.worker = threading.Thread(target=self._work, name=f"writebuffer-{store.name}", daemon=True)
+        self.worker.start()
+
+    # Function to durably queue rows (a dict, list of dicts or DataFrame) for
+    # the store. With wait=True it returns once they are committed, together
+    # with everything else waiting.
+    def submit(self, records, wait=False):
+        if isinstance(records, dict):  # one form entry: no need for a frame
+            rows = [{column: to_python(value) for column, value in records.items()}]
+        else:
+            df = to_frame(records)
+            rows = [dict(zip(df.columns, row)) for row in to_rows(df)]
+        if not rows:
+            return 0
+        line = json.dumps(rows) + "\n"
+        with metrics.timed("wal_submit", table=self.store.name) as span:
+            with file_lock(self.log_lock), open(self.log_path, "a+b") as f:
+                # After a torn write, start on a fresh line so this one stays readable
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    f.seek(size - 1)
+                    if f.read(1) != b"\n":
+                        line = "\n" + line
+                f.write(line.encode())
+                f.flush()
+                if WAL_FSYNC:
+                    os.fsync(f.fileno())
+            if span:
+                span.record(rows=len(rows), nbytes=len(line))
+        with self.lock:
+            self.submitted += len(rows)
+            self.waiting += len(rows)
+            if self.waiting >= self.flush_rows:
+                self.wake.set()
+        if wait:
+            self.flush()
+        return len(rows)
+
+    # Function to commit everything submitted so far, by any process, to the
+    # store; returns the number of rows this call committed
+    def flush(self):
+        with self.lock:
+            self.waiting = 0
+        committed = 0
+        with file_lock(self.flush_lock):
+            self._recover()
+            if os.path.exists(self.pending_path):  # left by a crashed commit
+                committed += self._commit()
+            with file_lock(self.log_lock):
+                if os.path.exists(self.log_path) and os.path.getsize(self.log_path):
+                    os.replace(self.log_path, self.pending_path)
+            if os.path.exists(self.pending_path):
+                committed += self._commit()
+        return committed
+
+    # Function to finish a commit interrupted by a crash: when the batch is
+    # found in the store, only the files are left to remove
+    def _recover(self):
+        if not os.path.exists(self.marker_path):
+            return
+        with open(self.marker_path) as f:
+            marker = json.load(f)
+        if os.path.exists(self.pending_path) and self._landed(marker["count_before"]):
+            os.remove(self.pending_path)
+            with self.lock:
+                self.recovered += marker["rows"]
+        os.remove(self.marker_path)
+
+    # Function to tell whether the pending batch was appended: its rows sit
+    # together somewhere after the count taken before the append, whatever
+    # other writers added before or after them
+    def _landed(self, count_before):
+        batch = to_frame(read_log(self.pending_path))
+        count = self.store.count()
+        if count < count_before + len(batch):
+            return False
+        if batch.empty:
+            return True
+        added = self.store.read_page(count - count_before, offset=count_before).reindex(columns=batch.columns)
+        batch, added = [_row_key(row) for row in to_rows(batch)], [_row_key(row) for row in to_rows(added)]
+        return any(added[i] == batch[0] and added[i:i + len(batch)] == batch
+                   for i in range(len(added) - len(batch) + 1))
+
+    def _commit(self):
+        start = time.perf_counter()
+        rows = read_log(self.pending_path)
+        if rows:
+            df = to_frame(rows)
+            with open(self.marker_path + ".tmp", "w") as f:
+                json.dump({"count_before": self.store.count(), "rows": len(rows)}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.marker_path + ".tmp", self.marker_path)
+            with metrics.timed("wal_commit", table=self.store.name) as span:
+                if self.cache is not None:
+                    self.cache.append(self.store, df)
+                else:
+                    self.store.append(df)
+                if span:
+                    span.record(rows=len(rows))
+        os.remove(self.pending_path)
+        if os.path.exists(self.marker_path):
+            os.remove(self.marker_path)
+        with self.lock:
+            self.committed += len(rows)
+            self.commits += bool(rows)
+            self.commit_seconds += time.perf_counter() - start
+        return len(rows)
+
+    def _work(self):
+        while not self.stopping:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if self.stopping:
+                return
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Group commit to %s failed; the rows stay in the log", self.store.name)
+
+    # Function to commit what is left and stop the flusher
+    def close(self):
+        if self.stopping:
+            return
+        self.stopping = True
+        self.wake.set()
+        self.worker.join()
+        self.flush()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "submitted": self.submitted,
+                "committed": self.committed,
+                "commits": self.commits,
+                "recovered": self.recovered,
+                "rows_per_commit": self.committed / self.commits if self.commits else 0.0,
+                "commit_seconds": self.commit_seconds,
+            }
+
+# Function to compare rows as stored and as logged: numbers as floats, and
+# empty strings as missing (the Excel backend reads '' back as NaN)
+def _row_key(row):
+    return tuple(None if value is None or value == "" else float(value) if isinstance(value, (int, float)) else value
+                 for value in row)
+
+# Function to read the rows of a log file, skipping a torn last line
+def read_log(path):
+    rows = []
+    with open(path, "rb") as f:
+        for number, line in enumerate(f, 1):
+            try:
+                rows += json.loads(line)
+            except ValueError:
+                log.warning("Skipping unreadable line %d of %s (a submit interrupted before it was acknowledged)", number, path)
+    return rows
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+# Function to get (or start) the process-wide buffer of a store; every session
+# shares it, like the store itself (see open_store). cache is used by the
+# first caller only.
+def write_buffer(store, cache=None):
+    with _buffers_lock:
+        if id(store) not in _buffers:
+            buffer = WriteBuffer(store, cache)
+            atexit.register(buffer.close)
+            _buffers[id(store)] = buffer
+        return _buffers[id(store)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Commit a store's write-behind log, e.g. after a crash.")
+    parser.add_argument("workbook", help="workbook the store belongs to, e.g. monthly_bills.xlsx")
+    parser.add_argument("--backend", choices=["sqlite", "columnar", "excel"], default=None)
+    args = parser.parse_args()
+
+    store = open_store(args.workbook, backend=args.backend)
+    buffer = WriteBuffer(store)
+    buffer.close()
+    stats = buffer.stats()
+    print(f"Committed {stats['committed']} rows ({stats['recovered']} found already committed); {store.count()} rows in store")